@@ -1,31 +1,49 @@
+import sqlite3
 import sys
 from pathlib import Path
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QTableView, 
                                QVBoxLayout, QWidget, QHeaderView)
-from PySide6.QtSql import QSqlDatabase, QSqlTableModel
-from PySide6.QtCore import Qt, QThread
+from PySide6.QtSql import QSqlDatabase, QSqlQuery, QSqlTableModel
+from PySide6.QtCore import Qt, QThread, QThreadPool, QTimer
 
 import logging
 
-from chipichipi.worker import ScannerWorker
+from chipichipi.database import BUSY_TIMEOUT_MS, init_db
 from chipichipi.models import MusicTableModel
-from chipichipi.progress_dialog import ScanProgressDialog
-from chipichipi.player import AudioPlayer
 from chipichipi.player_controls import PlayerControls
 
+logger = logging.getLogger(__name__)
+
+# The scanner worker, progress dialog and audio player (which pulls in
+# mutagen and pygame) are imported where they are first needed, so the
+# window can show before those modules load.
+
+# Minimum time between progress dialog refreshes during a scan
+PROGRESS_UPDATE_INTERVAL_MS = 50
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, db_path: Path = Path("music_library.db")):
         super().__init__()
         self.setWindowTitle("ChipiChipi Music Manager")
         self.setGeometry(100, 100, 1000, 600)
         
-        # Database path
-        self.db_path = Path("music_library.db")
+        # Database path, resolved once and reused by the Qt connection, model and scanner
+        self.db_path = Path(db_path).resolve()
+        self.db_path_str = str(self.db_path)
         
+        # Library model, created in setup_database
+        self.model = None
+
         # Scanner thread and worker
         self.scanner_thread = None
         self.scanner_worker = None
+
+        # Cached number of songs in the library (None until first queried)
+        self.song_count = None
+
+        # Latest (current_file, processed_count) not yet shown in the progress dialog
+        self.pending_progress = None
         
         self.setup_ui()
         self.setup_database()
@@ -54,7 +72,16 @@ class MainWindow(QMainWindow):
     def setup_player_controls(self):
         """Set up the audio player controls."""
         self.player_controls = PlayerControls()
-        self.audio_player = AudioPlayer()
+
+        # The audio player is created on first playback (see ensure_audio_player)
+        self.audio_player = None
+
+        # Audio files are loaded on a single background thread; each request
+        # gets a generation number so superseded loads are dropped.
+        self.audio_load_pool = QThreadPool(self)
+        self.audio_load_pool.setMaxThreadCount(1)
+        self.audio_load_generation = 0
+        self.audio_load_signals = None
         
         # Connect player control signals
         self.player_controls.play_requested.connect(self.play_audio)
@@ -62,6 +89,21 @@ class MainWindow(QMainWindow):
         self.player_controls.stop_requested.connect(self.stop_audio)
         self.player_controls.position_change_requested.connect(self.seek_audio)
         self.player_controls.volume_change_requested.connect(self.set_volume)
+
+    def ensure_audio_player(self):
+        """Create the audio player and its background loader on first use."""
+        if self.audio_player is not None:
+            return self.audio_player
+
+        from chipichipi.player import AudioPlayer
+        from chipichipi.worker import AudioLoadSignals
+
+        self.audio_player = AudioPlayer()
+        self.audio_player.set_volume(self.player_controls.volume_slider.value() / 100.0)
+
+        self.audio_load_signals = AudioLoadSignals()
+        self.audio_load_signals.loaded.connect(self.on_audio_loaded)
+        self.audio_load_signals.failed.connect(self.on_audio_load_failed)
         
         # Connect player signals to controls
         self.audio_player.position_changed.connect(self.update_player_position)
@@ -70,6 +112,7 @@ class MainWindow(QMainWindow):
         self.audio_player.playback_paused.connect(lambda: self.update_player_state(True, True))
         self.audio_player.playback_stopped.connect(lambda: self.update_player_state(False, False))
         self.audio_player.playback_ended.connect(lambda: self.update_player_state(False, False))
+        return self.audio_player
 
     def update_player_state(self, is_playing: bool, is_paused: bool):
         """Update UI based on playback state."""
@@ -87,34 +130,66 @@ class MainWindow(QMainWindow):
         """Play the selected audio file."""
         selection = self.table_view.selectionModel().selectedRows()
         if selection:
-            index = selection[0]
-            file_path = self.model.data(self.model.index(index.row(), 1))  # File path is column 1
-            if file_path:
-                if self.audio_player.load_file(Path(file_path)):
-                    if self.audio_player.play():
-                        self.statusBar().showMessage(f"Playing: {Path(file_path).name}")
-                    else:
-                        self.statusBar().showMessage("Error starting playback")
-                else:
-                    error_msg = "Error loading audio file. Check if the file format is supported."
-                    self.statusBar().showMessage(error_msg)
-                    logging.warning(f"Failed to load audio file: {file_path}")
+            self.play_row(selection[0].row())
+
+    def load_and_play(self, file_path: Path, duration: float = 0.0):
+        """
+        Load an audio file in the background and play it once loaded.
+
+        Pass the duration known from the library to spare the loader from
+        parsing the file's tags for it.
+        """
+        from chipichipi.worker import AudioLoadTask
+
+        # Stop here rather than in the load task: the player's timer belongs to this thread
+        if self.ensure_audio_player().is_playing:
+            self.audio_player.stop()
+        self.audio_load_generation += 1
+        self.statusBar().showMessage(f"Loading: {file_path.name}")
+        task = AudioLoadTask(self.audio_player, file_path, self.audio_load_generation,
+                             self.is_current_audio_load, self.audio_load_signals, duration)
+        self.audio_load_pool.start(task)
+
+    def is_current_audio_load(self, generation: int) -> bool:
+        """Check whether a load request is still the most recent one."""
+        return generation == self.audio_load_generation
+
+    def on_audio_loaded(self, generation: int, file_path: Path):
+        """Start playback of a file loaded by AudioLoadTask."""
+        if not self.is_current_audio_load(generation):
+            return
+        if self.audio_player.play():
+            self.statusBar().showMessage(f"Playing: {file_path.name}")
+        else:
+            self.statusBar().showMessage("Error starting playback")
+
+    def on_audio_load_failed(self, generation: int, file_path: Path):
+        """Report a file that AudioLoadTask could not load."""
+        if not self.is_current_audio_load(generation):
+            return
+        error_msg = "Error loading audio file. Check if the file format is supported."
+        self.statusBar().showMessage(error_msg)
+        logger.warning("Failed to load audio file: %s", file_path)
 
     def pause_audio(self):
         """Pause audio playback."""
-        self.audio_player.pause()
+        if self.audio_player:
+            self.audio_player.pause()
 
     def stop_audio(self):
         """Stop audio playback."""
-        self.audio_player.stop()
+        if self.audio_player:
+            self.audio_player.stop()
 
     def seek_audio(self, position: float):
         """Seek to specific position in audio."""
-        self.audio_player.set_position(position)
+        if self.audio_player:
+            self.audio_player.set_position(position)
 
     def set_volume(self, volume: float):
         """Set audio volume."""
-        self.audio_player.set_volume(volume)
+        if self.audio_player:
+            self.audio_player.set_volume(volume)
         
     def setup_menu(self):
         """Set up the menu bar."""
@@ -139,18 +214,29 @@ class MainWindow(QMainWindow):
         """Initialize the database connection and set up the model."""
         # Create a connection to the SQLite database
         self.db = QSqlDatabase.addDatabase("QSQLITE")
-        self.db.setDatabaseName(str(self.db_path.absolute()))
+        self.db.setDatabaseName(self.db_path_str)
+        # Wait for a scan's write transaction instead of failing immediately
+        self.db.setConnectOptions(f"QSQLITE_BUSY_TIMEOUT={BUSY_TIMEOUT_MS}")
 
         if not self.db.open():
             self.statusBar().showMessage("Failed to open database!")
             return
 
-        # Use our improved model creation
-        if not self.recreate_model():
+        # Add any columns missing from older databases before the model
+        # selects them; otherwise the library looks empty until a rescan
+        try:
+            init_db(self.db_path)
+        except sqlite3.Error as e:
+            self.statusBar().showMessage(f"Failed to update database: {e}")
+            return
+
+        # Create the model and configure the view once
+        if not self.create_model():
             self.statusBar().showMessage("Failed to create model!")
             return
         
-        # Show song count in status bar
+        # Query the song count once; scans report the new total afterwards
+        self.load_song_count()
         self.update_song_count()
 
         # Connect double-click to play
@@ -159,49 +245,55 @@ class MainWindow(QMainWindow):
     def on_song_double_clicked(self, index):
         """Handle double-click on song - play it."""
         if index.isValid():
-            file_path = self.model.data(self.model.index(index.row(), 1))  # File path is column 1
-            if file_path and Path(file_path).exists():
-                if self.audio_player.load_file(Path(file_path)):
-                    if self.audio_player.play():
-                        self.statusBar().showMessage(f"Playing: {Path(file_path).name}")
-                    else:
-                        self.statusBar().showMessage("Error starting playback")
-                else:
-                    error_msg = "Error loading audio file. Check if the file format is supported."
-                    self.statusBar().showMessage(error_msg)
-                    logging.warning(f"Failed to load audio file: {file_path}")
+            self.play_row(index.row())
+
+    def play_row(self, row: int):
+        """Play the song in a model row, using the duration stored by the scan."""
+        file_path = self.model.data(self.model.index(row, 1))  # File path is column 1
+        if file_path:
+            duration = self.model.data(self.model.index(row, self.model.fieldIndex("duration")), Qt.EditRole)
+            self.load_and_play(Path(file_path), duration or 0.0)
+
+    def load_song_count(self):
+        """Query the number of songs in the database and cache it."""
+        if not self.db.isOpen():
+            return
+        query = QSqlQuery(self.db)
+        query.prepare("SELECT COUNT(*) FROM songs")
+        if query.exec() and query.first():  # Move to the first result
+            self.song_count = query.value(0)  # Get the value of the first column
+        else:
+            self.song_count = None
 
     def update_song_count(self):
-        """Update the song count in the status bar."""
-        if self.db.isOpen():
-            # Use QSqlQuery instead of cursor()
-            query = self.db.exec("SELECT COUNT(*) FROM songs")
-            if query.first():  # Move to the first result
-                count = query.value(0)  # Get the value of the first column
-                self.statusBar().showMessage(f"Ready - {count} songs in library")
-            else:
-                self.statusBar().showMessage("Ready - No songs in library")
+        """Update the song count in the status bar from the cached count."""
+        if self.song_count:
+            self.statusBar().showMessage(f"Ready - {self.song_count} songs in library")
+        else:
+            self.statusBar().showMessage("Ready - No songs in library")
             
     def refresh_library(self):
         """Refresh the library view to show current database state."""
-        if self.recreate_model():
+        if self.model is None:
+            refreshed = self.create_model()
+        else:
+            refreshed = self.reload_model()
+        if refreshed:
             self.update_song_count()
             self.statusBar().showMessage("Library completely refreshed", 2000)
 
-    def recreate_model(self):
-        """Completely recreate the model (more thorough refresh)."""
-        if hasattr(self, 'model'):
-            # Clean up old model
-            self.model.deleteLater()
-        
-        # Use our custom model instead of QSqlTableModel
-        self.model = MusicTableModel(db=self.db)
-        self.model.setTable("songs")
-        
+    def reload_model(self):
+        """Re-run the model's query, keeping the existing model and view setup."""
         if not self.model.select():
-            error = self.model.lastError().text()
+            error = self.model.last_error
             self.statusBar().showMessage(f"Model error: {error}")
             return False
+        return True
+
+    def create_model(self):
+        """Create the library model and configure the table view for it (done once)."""
+        # Use our custom in-memory model instead of QSqlTableModel
+        self.model = MusicTableModel(self.db_path, self)
         
         # Set the new model
         self.table_view.setModel(self.model)
@@ -214,12 +306,18 @@ class MainWindow(QMainWindow):
         self.table_view.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)           # Title
         self.table_view.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)           # Artist
         self.table_view.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)           # Album
-        self.table_view.horizontalHeader().setSectionResizeMode(6, QHeaderView.ResizeToContents)  # Duration
+        self.table_view.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeToContents)  # Duration
+        self.table_view.horizontalHeader().setSectionResizeMode(6, QHeaderView.ResizeToContents)  # Track
+        self.table_view.horizontalHeader().setSectionResizeMode(7, QHeaderView.Interactive)       # Genre
         
         # Hide the ID column (column 0) if desired
         self.table_view.hideColumn(0)
+
+        # Hide the scan fingerprint columns, they are bookkeeping only
+        for column_name in ("mtime", "size"):
+            self.table_view.hideColumn(self.model.fieldIndex(column_name))
         
-        return True
+        return self.reload_model()
             
     def on_scan_directory(self):
         """Handle the Scan Directory menu action."""
@@ -237,9 +335,11 @@ class MainWindow(QMainWindow):
             
     def start_scan(self, directory_path: Path):
         """Start the scanning process in a separate thread."""
+        from chipichipi.worker import ScannerWorker
+
         # Create thread and worker
         self.scanner_thread = QThread()
-        self.scanner_worker = ScannerWorker(self.db_path)
+        self.scanner_worker = ScannerWorker(self.db_path, directory_path, batch_size=500)
         
         # Move worker to thread
         self.scanner_worker.moveToThread(self.scanner_thread)
@@ -250,15 +350,17 @@ class MainWindow(QMainWindow):
         self.scanner_worker.error.connect(self.on_scan_error)
         self.scanner_worker.progress.connect(self.on_scan_progress)
         self.scanner_worker.count_updated.connect(self.on_count_updated)
+        # Show scanned songs as each batch is written instead of reselecting afterwards
+        if self.model is not None:
+            self.scanner_worker.songs_written.connect(self.model.upsert_rows)
+            self.scanner_worker.songs_removed.connect(self.model.remove_rows)
         
         # Connect new progress signals
         self.scanner_worker.total_files_found.connect(self.on_total_files_found)
         self.scanner_worker.file_processed.connect(self.on_file_processed)
         
-        # Connect thread start to worker scan method
-        self.scanner_thread.started.connect(
-            lambda: self.scanner_worker.scan(directory_path)
-        )
+        # Connect thread start to the worker's run slot, which executes in the worker thread
+        self.scanner_thread.started.connect(self.scanner_worker.run)
         
         # Clean up when thread finishes
         self.scanner_thread.finished.connect(self.scanner_thread.deleteLater)
@@ -274,13 +376,25 @@ class MainWindow(QMainWindow):
         """Handle total files found signal - create and show progress dialog."""
         self.total_files = total_files
         if self.progress_dialog is None:
+            from chipichipi.progress_dialog import ScanProgressDialog
             self.progress_dialog = ScanProgressDialog(total_files, self)
             self.progress_dialog.cancel_button.clicked.connect(self.cancel_scan)
             self.progress_dialog.start_timer()
             self.progress_dialog.show()
 
     def on_file_processed(self, current_file, processed_count, total_files):
-        """Handle file processed signal - update progress dialog."""
+        """Handle file processed signal - schedule a progress dialog update."""
+        # Coalesce per-file signals: only the latest one is shown when the timer fires
+        if self.pending_progress is None:
+            QTimer.singleShot(PROGRESS_UPDATE_INTERVAL_MS, self.flush_progress)
+        self.pending_progress = (current_file, processed_count)
+
+    def flush_progress(self):
+        """Show the latest pending progress in the progress dialog."""
+        if self.pending_progress is None:
+            return
+        current_file, processed_count = self.pending_progress
+        self.pending_progress = None
         if self.progress_dialog and self.progress_dialog.isVisible():
             self.progress_dialog.update_progress(current_file, processed_count)
 
@@ -312,9 +426,6 @@ class MainWindow(QMainWindow):
             if action.text() and "Scan" in action.text():
                 action.setEnabled(True)
         
-        # Refresh the library view
-        self.refresh_library()
-        
         # Clean up thread
         if self.scanner_thread:
             self.scanner_thread.quit()
@@ -330,7 +441,7 @@ class MainWindow(QMainWindow):
             self.progress_dialog = None
             
         self.statusBar().showMessage(f"Error: {error_message}")
-        logging.error(error_message)
+        logger.error(error_message)
         
         # Re-enable scan action
         for action in self.menuBar().actions():
@@ -343,6 +454,7 @@ class MainWindow(QMainWindow):
         
     def on_count_updated(self, count: int):
         """Handle song count updates."""
+        self.song_count = count
         self.statusBar().showMessage(f"Scan complete! Found {count} songs total.")
         
     def closeEvent(self, event):
@@ -351,6 +463,10 @@ class MainWindow(QMainWindow):
         if self.scanner_thread and self.scanner_thread.isRunning():
             self.scanner_thread.quit()
             self.scanner_thread.wait()
+
+        # Let any in-flight audio load finish before tearing down
+        self.audio_load_generation += 1
+        self.audio_load_pool.waitForDone()
             
         # Close database connection
         if self.db.isOpen():
@@ -358,11 +474,14 @@ class MainWindow(QMainWindow):
             
         event.accept()
 
-def main():
+def main(db_path: Path = Path("music_library.db")):
     """Create and run the Qt application."""
+    # Configure logging here only, unless the caller (e.g. main.py) already did
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=logging.INFO)
     app = QApplication(sys.argv)
     
-    window = MainWindow()
+    window = MainWindow(db_path)
     window.show()
     
     sys.exit(app.exec())
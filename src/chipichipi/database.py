@@ -1,17 +1,80 @@
 import sqlite3
+from itertools import chain, islice
 from pathlib import Path
+from typing import Iterable, Literal
 from chipichipi.models import Song
 
-def get_db_connection(db_path: Path):
-    """Creates a connection to the SQLite database."""
-    conn = sqlite3.connect(db_path)
-    # This enables accessing columns by name instead of just index
-    conn.row_factory = sqlite3.Row
+# Upsert keeps the row id stable and only rewrites the metadata columns,
+# unlike INSERT OR REPLACE which deletes and reinserts the whole row.
+INSERT_SONG_SQL = '''
+    INSERT INTO songs 
+    (file_path, title, artist, album, duration, track_number, genre, mtime, size)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(file_path) DO UPDATE SET
+        title = excluded.title,
+        artist = excluded.artist,
+        album = excluded.album,
+        duration = excluded.duration,
+        track_number = excluded.track_number,
+        genre = excluded.genre,
+        mtime = excluded.mtime,
+        size = excluded.size
+'''
+
+# How long a connection waits on a lock held by another connection
+# (e.g. the GUI reading while a scan writes) before raising "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Connection-level tuning applied to every connection we open.
+# WAL lets the GUI read while a scan is writing, and NORMAL sync only
+# fsyncs at checkpoints instead of on every commit.
+CONNECTION_PRAGMAS = (
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",  # 20 MB page cache
+)
+
+# Size of the per-connection prepared statement cache (sqlite3 default is 128).
+# Statements are keyed by their exact SQL text, hence the module-level constants.
+CACHED_STATEMENTS = 256
+
+def get_db_connection(db_path: Path, row_factory: Literal["row", "tuple"] = "tuple"):
+    """
+    Creates a connection to the SQLite database.
+
+    Rows are plain tuples by default, which is cheapest for bulk reads;
+    pass row_factory="row" to get sqlite3.Row objects indexable by name.
+    """
+    # isolation_level=None disables the sqlite3 module's implicit BEGINs;
+    # transactions are opened explicitly where we write (see insert_songs).
+    conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=CACHED_STATEMENTS)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    if row_factory == "row":
+        # This enables accessing columns by name instead of just index
+        conn.row_factory = sqlite3.Row
     return conn
 
+def close_db_connection(conn: sqlite3.Connection):
+    """Closes a connection, first letting SQLite refresh its query planner statistics."""
+    try:
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+
 def init_db(db_path: Path):
     """Initializes the database with the required tables."""
+    # get_db_connection applies the WAL/sync pragmas before the table exists
     conn = get_db_connection(db_path)
+    try:
+        init_schema(conn)
+    finally:
+        close_db_connection(conn)
+
+def init_schema(conn: sqlite3.Connection):
+    """Creates the required tables on an already open connection."""
     cursor = conn.cursor()
 
     # Create the songs table
@@ -22,23 +85,99 @@ def init_db(db_path: Path):
             title TEXT,
             artist TEXT,
             album TEXT,
-            duration INTEGER
+            duration INTEGER,
+            track_number INTEGER,
+            genre TEXT,
+            mtime INTEGER,
+            size INTEGER
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # Add the newer columns to databases created before they existed
+    # table_info rows are (cid, name, type, notnull, dflt_value, pk)
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(songs)")}
+    for column, column_type in (('track_number', 'INTEGER'), ('genre', 'TEXT'),
+                                ('mtime', 'INTEGER'), ('size', 'INTEGER')):
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE songs ADD COLUMN {column} {column_type}')
 
-def insert_song(conn: sqlite3.Connection, song: Song):
-    """Inserts a Song object into the database."""
-    sql = '''
-        INSERT OR REPLACE INTO songs 
-        (file_path, title, artist, album, duration)
-        VALUES (?, ?, ?, ?, ?)
-    '''
-    cursor = conn.cursor()
-    cursor.execute(sql, (
+def song_to_row(song: Song) -> tuple:
+    """Converts a Song object into the parameter tuple used by INSERT_SONG_SQL."""
+    return (
         str(song.file_path), song.title, song.artist,
-        song.album, song.duration
-    ))
-    conn.commit()
\ No newline at end of file
+        song.album, song.duration, song.track_number, song.genre,
+        song.mtime, song.size
+    )
+
+def load_existing_fingerprints(conn: sqlite3.Connection) -> dict[str, tuple[int, int]]:
+    """
+    Returns {file_path: (mtime, size)} for every song in the database.
+
+    Loaded with a single SELECT so the scanner can skip unchanged files with
+    a dict lookup instead of querying once per file.
+    """
+    cursor = conn.execute("SELECT file_path, mtime, size FROM songs")
+    return {row[0]: (row[1], row[2]) for row in cursor}
+
+def fetch_song_rows(conn: sqlite3.Connection, file_paths: list[str], columns: Iterable[str]) -> list[tuple]:
+    """Returns the requested columns of the songs stored under the given file paths."""
+    column_list = ', '.join(columns)
+    rows = []
+    # Stay well below SQLite's limit on the number of bound parameters
+    for start in range(0, len(file_paths), 500):
+        chunk = file_paths[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        rows.extend(conn.execute(
+            f"SELECT {column_list} FROM songs WHERE file_path IN ({placeholders})", chunk
+        ))
+    return rows
+
+def delete_songs(conn: sqlite3.Connection, file_paths: Iterable[str]) -> int:
+    """Deletes the songs stored under the given file paths. Returns the number of rows deleted."""
+    params = ((file_path,) for file_path in file_paths)
+    if conn.in_transaction:
+        cursor = conn.executemany("DELETE FROM songs WHERE file_path = ?", params)
+    else:
+        conn.execute("BEGIN")
+        with conn:
+            cursor = conn.executemany("DELETE FROM songs WHERE file_path = ?", params)
+    return cursor.rowcount
+
+def insert_songs(conn: sqlite3.Connection, songs: Iterable[Song], batch_size: int | None = 1000) -> int:
+    """Inserts Song objects into the database in batches, see insert_rows()."""
+    return insert_rows(conn, map(song_to_row, songs), batch_size)
+
+def insert_rows(conn: sqlite3.Connection, rows: Iterable[tuple], batch_size: int | None = 1000) -> int:
+    """
+    Inserts song rows, as built by song_to_row(), into the database in batches.
+
+    Rows are streamed from the `rows` iterable straight into executemany(),
+    one call per batch of up to `batch_size` rows (or a single call for all
+    rows when `batch_size` is None), without building the batch in memory.
+    If the caller already opened a transaction the rows join it and the
+    caller decides when to commit; otherwise each batch gets its own
+    transaction. Returns the number of rows written.
+    """
+    cursor = conn.cursor()
+    rows = iter(rows)
+    rest_of_batch = batch_size - 1 if batch_size else None
+    total = 0
+
+    while True:
+        first_row = next(rows, None)
+        if first_row is None:
+            break
+        batch = chain((first_row,), islice(rows, rest_of_batch))
+        if conn.in_transaction:
+            cursor.executemany(INSERT_SONG_SQL, batch)
+        else:
+            cursor.execute("BEGIN")
+            with conn:
+                cursor.executemany(INSERT_SONG_SQL, batch)
+        total += cursor.rowcount
+
+    return total
+
+def insert_song(conn: sqlite3.Connection, song: Song):
+    """Inserts a single Song object into the database."""
+    insert_songs(conn, [song])
@@ -1,9 +1,17 @@
 import argparse
+import logging
 from pathlib import Path
 
 # Default database path
 DEFAULT_DB_PATH = Path("music_library.db")
 
+def non_negative_int(value: str) -> int:
+    """argparse type for counts where 0 means "off"."""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or more, got {number}")
+    return number
+
 def main():
     """Main CLI entry point."""
     parser = argparse.ArgumentParser(description='ChipiChipi Music Manager')
@@ -12,34 +20,43 @@ def main():
     # Scan command
     scan_parser = subparsers.add_parser('scan', help='Scan a directory for music')
     scan_parser.add_argument('directory', type=str, help='Path to the directory to scan')
-    scan_parser.add_argument('--db', type=str, default="music_library.db", 
+    scan_parser.add_argument('--db', type=str, default=str(DEFAULT_DB_PATH), 
                            help='Path to the SQLite database file')
+    scan_parser.add_argument('--processes', type=non_negative_int, default=0,
+                           help='Parse tags in this many worker processes instead of threads')
     
     # GUI command
     gui_parser = subparsers.add_parser('gui', help='Launch the graphical interface')
-    gui_parser.add_argument('--db', type=str, default="music_library.db",
+    gui_parser.add_argument('--db', type=str, default=str(DEFAULT_DB_PATH),
                           help='Path to the SQLite database file')
     
     args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
     
     if args.command == 'scan':
-        from chipichipi.database import get_db_connection, init_db
+        from chipichipi.database import get_db_connection, init_schema, close_db_connection
         from chipichipi.scanner import scan_directory
         
         target_dir = Path(args.directory)
-        db_path = Path(args.db)
+        db_path = Path(args.db).resolve()
         
-        init_db(db_path)
         conn = get_db_connection(db_path)
         try:
-            scan_directory(target_dir, conn)
-            print(f"Scan complete! Database saved to: {db_path.absolute()}")
+            init_schema(conn)
+
+            # One write transaction for the whole scan: committed on success,
+            # rolled back if the scan fails part-way through.
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                scan_directory(target_dir, conn, processes=args.processes)
+            print(f"Scan complete! Database saved to: {db_path}")
         finally:
-            conn.close()
+            close_db_connection(conn)
             
     elif args.command == 'gui':
         from chipichipi.app import main as gui_main
-        gui_main()
+        gui_main(Path(args.db))
         
     else:
         # If no command is provided, show help
@@ -1,9 +1,20 @@
+import sqlite3
+from bisect import bisect_right
 from dataclasses import dataclass
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from PySide6.QtSql import QSqlTableModel
-from PySide6.QtCore import Qt, QModelIndex
+from PySide6.QtCore import Qt, QModelIndex, QAbstractTableModel
 
-@dataclass
+# Roles looked up once instead of on every data() call
+DISPLAY_ROLE = Qt.DisplayRole
+EDIT_ROLE = Qt.EditRole
+HORIZONTAL = Qt.Horizontal
+
+# Size of the memo caches for the display formatters
+FORMAT_CACHE_SIZE = 4096
+
+@dataclass(slots=True)
 class Song:
     """A class to represent a song's metadata."""
     file_path: Path
@@ -11,61 +22,338 @@ class Song:
     artist: str = ""
     album: str = ""
     duration: int = 0  # in seconds
+    track_number: int = 0
+    genre: str = ""
+    mtime: int = 0  # file modification time in nanoseconds
+    size: int = 0  # file size in bytes
 
     # This method will be useful later for printing/displaying
     def __str__(self):
         return f"{self.artist} - {self.title}"
     
 
-class MusicTableModel(QSqlTableModel):
-    """Custom table model for music library with proper data formatting."""
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def format_duration(seconds: int) -> str:
+    """Convert seconds to MM:SS format."""
+    if not seconds:
+        return ""
+
+    minutes = seconds // 60
+    seconds = seconds % 60
+    return f"{minutes}:{seconds:02d}"
+
+
+@lru_cache(maxsize=FORMAT_CACHE_SIZE)
+def format_track_number(track_num: int) -> str:
+    """Format track number."""
+    if not track_num:
+        return ""
+    return str(track_num)
+
+
+class MusicTableModel(QAbstractTableModel):
+    """
+    Read-only table model for the music library.
+
+    Rows are loaded with a single query in select() and stored column by
+    column, so data() is a plain list lookup with no SQL round-trip per cell.
+    """
+
+    # Database columns shown by the model, in display order
+    COLUMNS = ("id", "file_path", "title", "artist", "album", "duration", "track_number", "genre",
+               "mtime", "size")
+
+    # Header labels for the visible columns
+    HEADERS = ("ID", "File Path", "Title", "Artist", "Album", "Duration", "Track", "Genre")
+
+    def __init__(self, db_path: Path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.last_error = ""
+        self._columns = [[] for _ in self.COLUMNS]
+        self._row_count = 0
+        self._sort_column = None
+        self._sort_order = Qt.AscendingOrder
+        self._row_by_path = None  # {file_path: row}, built on demand by upsert_rows
+        self._known_paths = None  # Set of file paths, built on demand by upsert_rows
+
+        # Display formatters by column index; other columns are shown as stored
+        self._formatters = {
+            self.COLUMNS.index("duration"): format_duration,
+            self.COLUMNS.index("track_number"): format_track_number,
+        }
+
+    def select(self) -> bool:
+        """Load every song from the database. Returns False on error."""
+        # Imported here because database.py imports Song from this module
+        from chipichipi.database import get_db_connection
+
+        try:
+            conn = get_db_connection(self.db_path)
+            try:
+                rows = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM songs").fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self.last_error = str(e)
+            return False
+
+        self.beginResetModel()
+        if rows:
+            self._columns = [list(column) for column in zip(*rows)]
+        else:
+            self._columns = [[] for _ in self.COLUMNS]
+        self._row_count = len(rows)
+        if self._sort_column is not None:
+            self._apply_sort()
+        self._row_by_path = None
+        self._known_paths = None
+        self.endResetModel()
+        return True
+
+    def upsert_rows(self, rows: list):
+        """
+        Merge freshly written database rows into the model.
+
+        Rows whose file path is already shown are updated in place and new
+        rows are inserted at their place in the current sort order, so a scan
+        never needs a full select() to show its results. Only when an update
+        changes a row's sort key is the whole model re-sorted.
+        """
+        path_column = self.COLUMNS.index("file_path")
+        if self._known_paths is None:
+            self._known_paths = set(self._columns[path_column])
+        new_rows = [values for values in rows if values[path_column] not in self._known_paths]
+        updated_rows = [values for values in rows if values[path_column] in self._known_paths]
+
+        # Row numbers shift whenever rows are inserted mid-table, so the
+        # path lookup is only rebuilt when a batch actually updates rows
+        if updated_rows and self._row_by_path is None:
+            self._row_by_path = dict(zip(self._columns[path_column], range(self._row_count)))
+
+        key_index, _ = self._sort_key()
+        key_column = self._columns[key_index]
+        # The upsert keeps a song's id, so only other sort keys can move rows
+        check_key = key_index != self.COLUMNS.index("id")
+        changed_rows = []
+        resort = False
+        for values in updated_rows:
+            row = self._row_by_path[values[path_column]]
+            if check_key and values[key_index] != key_column[row]:
+                resort = True
+            for column, value in zip(self._columns, values):
+                column[row] = value
+            changed_rows.append(row)
+
+        if changed_rows:
+            self.dataChanged.emit(self.index(min(changed_rows), 0),
+                                  self.index(max(changed_rows), len(self.COLUMNS) - 1))
+
+        if new_rows:
+            self._known_paths.update(values[path_column] for values in new_rows)
+        if resort:
+            self._resort_rows(new_rows, path_column)
+        elif new_rows:
+            self._insert_sorted_rows(new_rows, path_column)
+
+    def _insert_sorted_rows(self, new_rows: list, path_column: int):
+        """Insert rows not yet in the model at their positions in the sort order."""
+        key_index, descending = self._sort_key()
+        key_column = self._columns[key_index]
+        new_rows = self._sorted_rows(new_rows, key_index, descending)
+
+        # NULL keys are kept after every other row, see _apply_sort()
+        null_start = self._null_start(key_column)
+        positions = [
+            self._row_count if values[key_index] is None
+            else self._insert_position(key_column, values[key_index], null_start, descending)
+            for values in new_rows
+        ]
+
+        first = positions[0]
+        if first == positions[-1]:
+            # One contiguous block (always the case when appending in id order)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_rows) - 1)
+            for column, values in zip(self._columns, zip(*new_rows)):
+                column[first:first] = values
+            if first == self._row_count and self._row_by_path is not None:
+                for row, values in enumerate(new_rows, start=first):
+                    self._row_by_path[values[path_column]] = row
+            elif first != self._row_count:
+                self._row_by_path = None
+            self._row_count += len(new_rows)
+            self.endInsertRows()
+        else:
+            # Rows land in several places: splice them in as a layout change,
+            # so the view keeps its selection and scroll position
+            self.layoutAboutToBeChanged.emit()
+            old_indexes = self.persistentIndexList()
+            ends = positions[1:] + [self._row_count]
+            self._columns = [
+                self._splice(column, values, positions, ends)
+                for column, values in zip(self._columns, zip(*new_rows))
+            ]
+            self._row_count += len(new_rows)
+            self._row_by_path = None
+            self.changePersistentIndexList(old_indexes, [
+                self.index(index.row() + bisect_right(positions, index.row()), index.column())
+                for index in old_indexes
+            ])
+            self.layoutChanged.emit()
+
+    @staticmethod
+    def _splice(column: list, values: tuple, positions: list, ends: list) -> list:
+        """Return column with values[i] inserted before old row positions[i]."""
+        merged = column[:positions[0]]
+        for value, start, end in zip(values, positions, ends):
+            merged.append(value)
+            merged.extend(column[start:end])
+        return merged
+
+    @staticmethod
+    def _sorted_rows(rows: list, key_index: int, descending: bool) -> list:
+        """Sort rows by one column like _apply_sort(), NULLs last."""
+        null_rows = [values for values in rows if values[key_index] is None]
+        ordered = sorted((values for values in rows if values[key_index] is not None),
+                         key=itemgetter(key_index), reverse=descending)
+        ordered.extend(null_rows)
+        return ordered
+
+    def _null_start(self, key_column: list) -> int:
+        """Return the first row of the trailing block of NULL sort keys."""
+        lo, hi = 0, self._row_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_column[mid] is None:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @staticmethod
+    def _insert_position(key_column: list, value, hi: int, descending: bool) -> int:
+        """Bisect for value in key_column[:hi], after any equal keys."""
+        lo = 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (value > key_column[mid]) if descending else (value < key_column[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _resort_rows(self, new_rows: list, path_column: int):
+        """
+        Append new rows and put every row back in sort order.
+
+        Used when an update moved existing rows; done as a layout change so
+        persistent indexes follow their song.
+        """
+        self.layoutAboutToBeChanged.emit()
+        paths = self._columns[path_column]
+        old_indexes = self.persistentIndexList()
+        old_paths = [paths[index.row()] for index in old_indexes]
+
+        if new_rows:
+            for column, values in zip(self._columns, zip(*new_rows)):
+                column.extend(values)
+            self._row_count += len(new_rows)
+
+        self._apply_sort()
+        self._row_by_path = dict(zip(self._columns[path_column], range(self._row_count)))
+        self.changePersistentIndexList(old_indexes, [
+            self.index(self._row_by_path[path], index.column())
+            for path, index in zip(old_paths, old_indexes)
+        ])
+        self.layoutChanged.emit()
+
+    def remove_rows(self, file_paths: list):
+        """Remove the rows for the given file paths (songs deleted by a rescan)."""
+        removed = set(file_paths)
+        path_column = self._columns[self.COLUMNS.index("file_path")]
+        keep = [row for row, path in enumerate(path_column) if path not in removed]
+        if len(keep) == self._row_count:
+            return
+
+        self.beginResetModel()
+        self._columns = [[column[row] for row in keep] for column in self._columns]
+        self._row_count = len(keep)
+        self._row_by_path = None
+        self._known_paths = None
+        self.endResetModel()
+
+    def fieldIndex(self, field_name: str) -> int:
+        """Return the column index of a database field, or -1 if unknown."""
+        try:
+            return self.COLUMNS.index(field_name)
+        except ValueError:
+            return -1
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
     
     def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
-        """Override data method to format specific columns."""
+        """Return the value of a cell, formatting specific columns for display."""
         if not index.isValid():
             return None
-        
-        # Handle display role for specific columns
-        if role == Qt.DisplayRole:
-            column = index.column()
-            
-            # Get the raw value from the parent class
-            value = super().data(index, role)
-            
-            # Format duration column (seconds to MM:SS)
-            if column == 6:  # Assuming duration is column 6 (0-based index)
-                return self.format_duration(value)
-            
-            # Format track number column
-            elif column == 5:  # Assuming track_number is column 5
-                return self.format_track_number(value)
-            
-            return value
-        
-        return super().data(index, role)
-    
-    def format_duration(self, seconds: int) -> str:
-        """Convert seconds to MM:SS format."""
-        if not seconds or seconds == 0:
-            return ""
-        
-        minutes = seconds // 60
-        seconds = seconds % 60
-        return f"{minutes}:{seconds:02d}"
-    
-    def format_track_number(self, track_num: int) -> str:
-        """Format track number."""
-        if not track_num or track_num == 0:
-            return ""
-        return str(track_num)
+
+        column = index.column()
+        if role == DISPLAY_ROLE:
+            value = self._columns[column][index.row()]
+            formatter = self._formatters.get(column)
+            return formatter(value) if formatter else value
+
+        if role == EDIT_ROLE:
+            return self._columns[column][index.row()]
+
+        return None
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.AscendingOrder):
+        """Sort the rows in memory by one column; -1 restores database order."""
+        if column < 0:
+            # Qt passes -1 when the sort indicator is cleared
+            self._sort_column = None
+            self._sort_order = Qt.AscendingOrder
+        else:
+            self._sort_column = column
+            self._sort_order = order
+        self.beginResetModel()
+        self._apply_sort()
+        self._row_by_path = None
+        self.endResetModel()
+
+    def _sort_key(self) -> tuple:
+        """Return (column, descending) for the current row order; unsorted is id order."""
+        if self._sort_column is None:
+            return self.COLUMNS.index("id"), False
+        return self._sort_column, self._sort_order == Qt.DescendingOrder
+
+    def _apply_sort(self):
+        """Reorder every column by the current sort column."""
+        key_index, descending = self._sort_key()
+        key_column = self._columns[key_index]
+        # NULLs sort last in either direction, like an empty cell would
+        null_rows = [row for row in range(self._row_count) if key_column[row] is None]
+        order = sorted(
+            (row for row in range(self._row_count) if key_column[row] is not None),
+            key=key_column.__getitem__,
+            reverse=descending,
+        )
+        order.extend(null_rows)
+        self._columns = [[column[row] for row in order] for column in self._columns]
     
+    # Kept as attributes so existing callers of model.format_duration still work
+    format_duration = staticmethod(format_duration)
+    format_track_number = staticmethod(format_track_number)
+
     def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole):
         """Override header data to provide better column names."""
-        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
-            headers = [
-                "ID", "File Path", "Title", "Artist", "Album", 
-                "Duration"
-            ]
-            if section < len(headers):
-                return headers[section]
+        if orientation == HORIZONTAL and role == DISPLAY_ROLE:
+            try:
+                return self.HEADERS[section]
+            except IndexError:
+                pass
         return super().headerData(section, orientation, role)
\ No newline at end of file
@@ -1,11 +1,27 @@
+import os
+import stat
 import pygame
-import time
 from pathlib import Path
-from PySide6.QtCore import QObject, Signal, QThread
+from mutagen import File
+from PySide6.QtCore import QObject, Signal, QTimer
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Delay before the first playback position refresh after play()
+POSITION_UPDATE_INTERVAL_MS = 100
+
+# Later refreshes are scheduled for just after the next whole second of the
+# track, when the displayed time changes, but never sooner than this
+POSITION_MIN_INTERVAL_MS = 20
+POSITION_TIMER_SLACK_MS = 5
+
+# Mixer buffer sizes in samples. At 44.1 kHz the default is ~93 ms, which is
+# imperceptible for music and keeps playback from dropping out under load;
+# the low-latency size is ~23 ms.
+MIXER_BUFFER_SIZE = 4096
+LOW_LATENCY_BUFFER_SIZE = 1024
+
 class AudioPlayer(QObject):
     """Audio player using pygame for playback."""
     
@@ -17,14 +33,25 @@ class AudioPlayer(QObject):
     position_changed = Signal(float)  # Current position in seconds
     duration_changed = Signal(float)  # Total duration in seconds
     
-    def __init__(self):
+    def __init__(self, low_latency: bool = False):
         super().__init__()
+        self.low_latency = low_latency
         self._initialize_pygame()
         self.current_file = None
         self.is_playing = False
         self.is_paused = False
         self.duration = 0.0
         self.position = 0.0
+
+        # pygame's get_pos() counts from play(), so seeking stores the offset
+        # between that clock and the real position in the track
+        self._play_offset = 0.0
+
+        # Position tracking runs on the thread that owns the player. The timer
+        # is single-shot and each refresh schedules the next one.
+        self._position_timer = QTimer(self)
+        self._position_timer.setSingleShot(True)
+        self._position_timer.timeout.connect(self._update_position)
         
     def _initialize_pygame(self):
         """Initialize pygame mixer with optimal settings for MP3 playback."""
@@ -33,12 +60,13 @@ class AudioPlayer(QObject):
             pygame.mixer.quit()
             
             # Initialize with specific settings that work better with MP3s
-            # frequency=44100, size=-16, channels=2, buffer=1024
+            # frequency=44100, size=-16, channels=2, buffer=4096
             pygame.mixer.pre_init(
                 frequency=44100,    # CD quality sample rate
                 size=-16,          # 16-bit signed samples
                 channels=2,        # Stereo
-                buffer=1024        # Smaller buffer for less latency
+                # Large buffer for robustness unless low latency was requested
+                buffer=LOW_LATENCY_BUFFER_SIZE if self.low_latency else MIXER_BUFFER_SIZE
             )
             pygame.mixer.init()
             
@@ -70,40 +98,33 @@ class AudioPlayer(QObject):
             logger.error(f"Failed to reinitialize mixer: {e}")
             return False
         
-    def load_file(self, file_path: Path):
-        """Load an audio file for playback."""
+    def load_file(self, file_path: Path, duration: float = 0.0):
+        """
+        Load an audio file for playback.
+
+        `duration` is the track length in seconds when the caller already
+        knows it (e.g. from the library database); otherwise it is read
+        from the file's tags with mutagen.
+        """
         try:
             if self.is_playing:
                 self.stop()
             
-            # Validate file exists and is readable
-            if not file_path.exists():
-                logger.error(f"File does not exist: {file_path}")
-                return False
-            
-            if not file_path.is_file():
-                logger.error(f"Path is not a file: {file_path}")
-                return False
-            
-            # Validate file with mutagen first
-            from mutagen import File
+            # Validate file exists and is a regular file, with a single stat
             try:
-                audio_file = File(file_path)
-                if audio_file is None:
-                    logger.error(f"File is not a valid audio file: {file_path}")
+                if not stat.S_ISREG(os.stat(file_path).st_mode):
+                    logger.error(f"Path is not a file: {file_path}")
                     return False
-                    
-                # Get duration using mutagen
-                if hasattr(audio_file, 'info') and hasattr(audio_file.info, 'length'):
-                    self.duration = audio_file.info.length
-                    logger.info(f"Audio file duration: {self.duration:.2f}s")
-                else:
-                    self.duration = 0
-                    logger.warning(f"Could not determine duration for: {file_path}")
-                    
-            except Exception as e:
-                logger.error(f"Mutagen validation failed for {file_path}: {e}")
+            except FileNotFoundError:
+                logger.error(f"File does not exist: {file_path}")
                 return False
+
+            if duration > 0:
+                self.duration = duration
+            else:
+                # Unknown duration: read it with mutagen, which also validates the file
+                if not self._read_duration(file_path):
+                    return False
             
             # Try to load with pygame
             try:
@@ -132,6 +153,27 @@ class AudioPlayer(QObject):
             logger.error(f"Unexpected error loading file {file_path}: {e}")
             return False
     
+    def _read_duration(self, file_path: Path) -> bool:
+        """Read the track length with mutagen. Returns False if the file isn't valid audio."""
+        try:
+            audio_file = File(file_path)
+            if audio_file is None:
+                logger.error(f"File is not a valid audio file: {file_path}")
+                return False
+                    
+            # Get duration using mutagen
+            if hasattr(audio_file, 'info') and hasattr(audio_file.info, 'length'):
+                self.duration = audio_file.info.length
+                logger.info(f"Audio file duration: {self.duration:.2f}s")
+            else:
+                self.duration = 0
+                logger.warning(f"Could not determine duration for: {file_path}")
+                    
+        except Exception as e:
+            logger.error(f"Mutagen validation failed for {file_path}: {e}")
+            return False
+        return True
+
     def play(self):
         """Start or resume playback."""
         try:
@@ -145,13 +187,14 @@ class AudioPlayer(QObject):
                 logger.info("Resumed playback")
             else:
                 pygame.mixer.music.play()
+                self._play_offset = 0.0
                 logger.info(f"Started playback of: {self.current_file.name}")
                 
             self.is_playing = True
             self.playback_started.emit()
             
-            # Start position tracking thread
-            self.start_position_tracking()
+            # Start position tracking
+            self._position_timer.start(POSITION_UPDATE_INTERVAL_MS)
             return True
             
         except pygame.error as e:
@@ -166,6 +209,7 @@ class AudioPlayer(QObject):
         try:
             if self.is_playing and not self.is_paused:
                 pygame.mixer.music.pause()
+                self._position_timer.stop()
                 self.is_paused = True
                 self.playback_paused.emit()
         except Exception as e:
@@ -175,6 +219,7 @@ class AudioPlayer(QObject):
         """Stop playback."""
         try:
             pygame.mixer.music.stop()
+            self._position_timer.stop()
             self.is_playing = False
             self.is_paused = False
             self.position = 0.0
@@ -188,36 +233,45 @@ class AudioPlayer(QObject):
         """Set playback position in seconds."""
         try:
             pygame.mixer.music.set_pos(position)
+            self._play_offset = position - max(pygame.mixer.music.get_pos(), 0) / 1000.0
             self.position = position
             self.position_changed.emit(position)
         except Exception as e:
             logger.error(f"Error setting position: {e}")
     
-    def start_position_tracking(self):
-        """Start a thread to track playback position."""
-        def track_position():
-            while self.is_playing and not self.is_paused:
-                try:
-                    # Get current position (this is approximate)
-                    if pygame.mixer.music.get_busy():
-                        # Estimate position based on playback start time
-                        # Note: pygame doesn't provide exact position tracking
-                        # This is an approximation
-                        self.position += 0.1  # Update every 100ms
-                        if self.position > self.duration:
-                            self.position = self.duration
-                            self.stop()
-                            self.playback_ended.emit()
-                        else:
-                            self.position_changed.emit(self.position)
-                    time.sleep(0.1)  # Update every 100ms
-                except:
-                    break
-        
-        # Start tracking in a separate thread
-        self.tracking_thread = QThread()
-        self.tracking_thread.run = track_position
-        self.tracking_thread.start()
+    def _update_position(self):
+        """Refresh the playback position from pygame's clock (runs on the position timer)."""
+        try:
+            if not pygame.mixer.music.get_busy():
+                # The track played to the end
+                self.stop()
+                self.playback_ended.emit()
+                return
+
+            position = min(self._play_offset + pygame.mixer.music.get_pos() / 1000.0, self.duration)
+            previous_second = int(self.position)
+            self.position = position
+
+            # The display shows whole seconds, so only signal when that changes
+            if int(position) != previous_second:
+                self.position_changed.emit(position)
+
+            if 0 < self.duration <= position:
+                # Past the known duration (stored durations are truncated to
+                # whole seconds), so only wait for pygame to report the end
+                self._position_timer.start(POSITION_UPDATE_INTERVAL_MS)
+                return
+
+            # Sleep until the next whole second (or the end of the track)
+            # instead of polling pygame's clock at a fixed rate
+            next_update = int(position) + 1
+            if 0 < self.duration < next_update:
+                next_update = self.duration
+            delay_ms = int((next_update - position) * 1000) + POSITION_TIMER_SLACK_MS
+            self._position_timer.start(max(delay_ms, POSITION_MIN_INTERVAL_MS))
+        except pygame.error as e:
+            logger.error(f"Error updating position: {e}")
+            self._position_timer.stop()
     
     def get_volume(self):
         """Get current volume (0.0 to 1.0)."""
@@ -59,9 +59,7 @@ class PlayerControls(QWidget):
         self.volume_slider = QSlider(Qt.Horizontal)
         self.volume_slider.setRange(0, 100)
         self.volume_slider.setValue(80)
-        self.volume_slider.valueChanged.connect(
-            lambda value: self.volume_change_requested.emit(value / 100.0)
-        )
+        self.volume_slider.valueChanged.connect(self._on_volume_changed)
         volume_layout.addWidget(self.volume_slider)
         
         # Add all layouts to main layout
@@ -69,14 +67,18 @@ class PlayerControls(QWidget):
         layout.addLayout(progress_layout)
         layout.addLayout(volume_layout)
     
+    def _on_volume_changed(self, value):
+        """Handle volume slider changes (0-100) as a 0.0-1.0 volume."""
+        self.volume_change_requested.emit(value * 0.01)
+    
     def _on_slider_moved(self, value):
         """Handle slider movement."""
-        position = value / 1000.0
+        position = value * 0.001
         self._update_time_label(position, None)
     
     def _on_slider_released(self):
         """Handle slider release - seek to position."""
-        position = self.progress_slider.value() / 1000.0
+        position = self.progress_slider.value() * 0.001
         self.position_change_requested.emit(position)
     
     def update_position(self, position: float, duration: float):
@@ -2,6 +2,9 @@ from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel,
                                QProgressBar, QPushButton, QHBoxLayout)
 from PySide6.QtCore import Qt, QTimer, QElapsedTimer
 
+# Minimum time between label/progress bar repaints (~20 Hz)
+UI_UPDATE_INTERVAL_MS = 50
+
 class ScanProgressDialog(QDialog):
     """Dialog to show scanning progress with estimated time."""
     
@@ -10,6 +13,9 @@ class ScanProgressDialog(QDialog):
         self.total_files = total_files
         self.processed_files = 0
         self.elapsed_timer = QElapsedTimer()  # Use QElapsedTimer instead
+        self._last_ui_update_ms = None
+        self._last_details = (None, None, None)  # (eta, elapsed, file) last rendered
+        self._file_text = ""
         self.setWindowTitle("Scanning Library")
         self.setModal(True)
         self.setFixedSize(400, 150)
@@ -46,32 +52,45 @@ class ScanProgressDialog(QDialog):
     def update_progress(self, current_file_path, processed_count):
         """Update the progress with current file and count."""
         self.processed_files = processed_count
+
+        # Repaint at most every UI_UPDATE_INTERVAL_MS, but always show the last file
+        if self.elapsed_timer.isValid() and processed_count < self.total_files:
+            now_ms = self.elapsed_timer.elapsed()
+            if (self._last_ui_update_ms is not None
+                    and now_ms - self._last_ui_update_ms < UI_UPDATE_INTERVAL_MS):
+                return
+            self._last_ui_update_ms = now_ms
+
         self.progress_bar.setValue(processed_count)
         
-        # Calculate progress percentage
-        progress_percent = (processed_count / self.total_files) * 100
-        
         # Update status
         self.status_label.setText(f"Scanning: {processed_count}/{self.total_files} files")
         
-        # Calculate ETA if we have start time
+        # Calculate ETA if we have start time, at whole-second resolution
+        eta_seconds = elapsed_seconds = None
         if self.elapsed_timer.isValid() and processed_count > 0:
             elapsed = self.elapsed_timer.elapsed() / 1000  # Convert to seconds
-            files_per_second = processed_count / elapsed
-            remaining_files = self.total_files - processed_count
-            
-            if files_per_second > 0:
-                eta_seconds = remaining_files / files_per_second
-                eta_text = self.format_time(eta_seconds)
-                elapsed_text = self.format_time(elapsed)
-                self.details_label.setText(
-                    f"ETA: {eta_text} | Elapsed: {elapsed_text} | "
-                    f"File: {current_file_path.name[:30]}..."
-                )
-            else:
-                self.details_label.setText(f"File: {current_file_path.name[:30]}...")
+            if elapsed > 0:
+                files_per_second = processed_count / elapsed
+                remaining_files = self.total_files - processed_count
+                eta_seconds = int(remaining_files / files_per_second)
+                elapsed_seconds = int(elapsed)
+
+        # Only rebuild and re-render the details text when it would change
+        details = (eta_seconds, elapsed_seconds, current_file_path)
+        if details == self._last_details:
+            return
+        if current_file_path != self._last_details[2]:
+            self._file_text = "File: {}...".format(current_file_path.name[:30])
+        self._last_details = details
+
+        if eta_seconds is not None:
+            self.details_label.setText(
+                f"ETA: {self.format_time(eta_seconds)} | "
+                f"Elapsed: {self.format_time(elapsed_seconds)} | {self._file_text}"
+            )
         else:
-            self.details_label.setText(f"File: {current_file_path.name[:30]}...")
+            self.details_label.setText(self._file_text)
     
     def format_time(self, seconds):
         """Format seconds into HH:MM:SS or MM:SS."""
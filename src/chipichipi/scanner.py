@@ -1,160 +1,561 @@
+import importlib
 import logging
+import mmap
+import multiprocessing
+import os
+import queue
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import replace
+from functools import lru_cache
 from pathlib import Path
 from mutagen import File
-from mutagen.mp3 import MP3
-from mutagen.mp4 import MP4
-from mutagen.flac import FLAC
 import re
 from typing import Tuple, Optional
 
 from chipichipi.models import Song
 
-# Set up logging to see what's happening
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the entry points (main.py, app.py), not on import
 logger = logging.getLogger(__name__)
 
-# Map file extensions to their respective mutagen class
+# Map file extensions to their respective mutagen class, as "module:class".
+# The format modules are only imported once a file of that type is parsed,
+# see get_parser_class().
 AUDIO_FILE_EXTENSIONS = {
-    '.mp3': MP3,
-    '.flac': FLAC,
-    '.m4a': MP4
+    '.mp3': 'mutagen.mp3:MP3',
+    '.flac': 'mutagen.flac:FLAC',
+    '.m4a': 'mutagen.mp4:MP4'
 }
 
+# Extensions the directory walk picks up, as a frozenset for cheap membership tests
+AUDIO_SUFFIXES = frozenset(AUDIO_FILE_EXTENSIONS)
+
+# Parser classes already imported, by "module:class" spec
+_parser_classes = {}
+
+# Tag keys for (title, artist, album, genre, track number), by the name of the
+# mutagen class that parsed the file. Anything else (FLAC, the Easy* classes
+# returned by the File(easy=True) fallback) uses the plain Vorbis-style names.
+TAG_KEYS = {
+    'MP3': ('TIT2', 'TPE1', 'TALB', 'TCON', 'TRCK'),
+    'MP4': ('\xa9nam', '\xa9ART', '\xa9alb', '\xa9gen', 'trkn'),
+}
+DEFAULT_TAG_KEYS = ('title', 'artist', 'album', 'genre', 'tracknumber')
+
+# Number of parsed files kept in the in-memory metadata cache
+METADATA_CACHE_SIZE = 4096
+
+# Number of cleaned tag values kept in memory. Artist, album and genre
+# strings repeat heavily across a library.
+TAG_VALUE_CACHE_SIZE = 8192
+
+# Files up to this size are memory-mapped whole for tag parsing
+MMAP_MAX_SIZE = 1 << 20  # 1 MiB
+
+# Threads used to parse tags. Parsing is dominated by file reads, during
+# which mutagen releases the GIL, so it scales past the number of cores.
+PARSE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Files handed to a parser process at a time when parsing in processes,
+# to amortize the cost of sending work and results between processes
+PROCESS_CHUNK_SIZE = 8
+
+# Parsed songs allowed to wait for the database writer during a scan
+SCAN_QUEUE_SIZE = 256
+
+# Threads used to list directories during a scan. Filesystems tend to
+# serialize directory reads per volume, so a handful of threads helps and
+# more tend to hurt. Override with the CHIPICHIPI_SCAN_WORKERS variable.
+DEFAULT_SCAN_WORKERS = 4
+
+def scan_workers_from_env() -> int:
+    """Reads CHIPICHIPI_SCAN_WORKERS, falling back to the default if it isn't an integer."""
+    value = os.environ.get('CHIPICHIPI_SCAN_WORKERS')
+    if value is None:
+        return DEFAULT_SCAN_WORKERS
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning("Ignoring CHIPICHIPI_SCAN_WORKERS=%r, expected an integer; using %d",
+                       value, DEFAULT_SCAN_WORKERS)
+        return DEFAULT_SCAN_WORKERS
+
+SCAN_WORKERS = scan_workers_from_env()
+
+# Extensions removed from a filename before parsing artist and title out of it
+FILENAME_AUDIO_EXTENSIONS = frozenset(('.mp3', '.flac', '.m4a', '.wav', '.aiff', '.ogg'))
+
+# Pattern used to clean up metadata, compiled once at import
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Filename separators for "Artist <sep> Title", in order of likelihood. A
+# filename is split at the first match of a separator, so each is a single
+# linear scan with no backtracking; whitespace around it is stripped after.
+ARTIST_TITLE_SEPARATORS = (
+    re.compile(r'[-–—]+'),                # Most common: "Artist - Title", also "Artist---Title"
+    re.compile(r'\s+by\s+', re.IGNORECASE),  # "Artist by Title" pattern
+    re.compile(r'_'),                     # Underscore separator: "Artist_Title"
+    re.compile(r'\('),                    # Parentheses: "Artist (Title)"
+)
+
+# All separators fused into one pattern, so a filename without any of them
+# is rejected in a single pass instead of one search per separator
+ANY_ARTIST_TITLE_SEPARATOR = re.compile(
+    '|'.join(separator.pattern for separator in ARTIST_TITLE_SEPARATORS), re.IGNORECASE
+)
+
+def get_parser_class(file_extension: str):
+    """
+    Returns the mutagen class for a lowercase file extension (e.g. '.mp3'),
+    importing its module on first use, or None for unsupported extensions.
+    """
+    spec = AUDIO_FILE_EXTENSIONS.get(file_extension)
+    if spec is None:
+        return None
+
+    parser_class = _parser_classes.get(spec)
+    if parser_class is None:
+        module_name, class_name = spec.split(':')
+        parser_class = getattr(importlib.import_module(module_name), class_name)
+        _parser_classes[spec] = parser_class
+    return parser_class
+
 def get_audio_tag(file: File, tag_name: str) -> str:
     """Safely retrieves a tag from a mutagen file object."""
+    return first_tag_value(file.tags, tag_name) if file.tags is not None else ""
+
+def first_tag_value(tags, tag_name: str, default=""):
+    """Returns the first value of a tag, or `default` if the tag is missing or empty."""
+    # Tags can be lists of values (or ID3 frames indexable like one)
+    if tag_name not in tags:
+        return default
     try:
-        # Tags can be lists of values. We take the first one.
-        value = file.tags.get(tag_name)
-        return value[0] if value else ""
-    except (AttributeError, KeyError, IndexError):
-        return ""
+        return tags[tag_name][0]
+    except (KeyError, IndexError):
+        return default
+
+def tag_text(tags, tag_name: str, default: str = "") -> str:
+    """Returns the first value of a tag as a string, converting only non-str values."""
+    value = first_tag_value(tags, tag_name, default)
+    return value if value.__class__ is str else str(value)
 
 def get_audio_duration(audio_file) -> int:
     """Safely retrieves the duration of the audio file in seconds."""
     try:
         if hasattr(audio_file, 'info') and hasattr(audio_file.info, 'length'):
-            duration = int(audio_file.info.length)
-            logger.debug(f"Duration for {getattr(audio_file, 'filename', 'unknown')}: {duration}s")
-            return duration
+            return int(audio_file.info.length)
         return 0
     except (AttributeError, TypeError, ValueError) as e:
-        logger.debug(f"Could not get duration: {e}")
+        logger.debug("Could not get duration: %s", e)
         return 0
 
-def scan_file(file_path: Path) -> Song | None:
-    """Scans a single audio file and returns a Song object with its metadata."""
-    file_extension = file_path.suffix.lower()
+def file_fingerprint(file_path: str | os.PathLike) -> Tuple[int, int]:
+    """Returns the (mtime in nanoseconds, size in bytes) of a file."""
+    stat_result = os.stat(file_path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+def list_audio_directory(directory) -> Tuple[list, list, list]:
+    """
+    Lists a single directory.
+
+    Returns (subdirectories, audio files, unreadable paths), where audio
+    files are (file_path, fingerprint) pairs and unreadable paths are the
+    directory itself if it could not be listed, or audio files that could
+    not be stat'ed. The file type comes from the directory
+    listing and each audio file is stat'ed exactly once; the fingerprint is
+    reused all the way to the database. Entries are filtered by extension
+    and type before anything is opened, so non-audio files and special
+    files never reach mutagen.
+    """
+    subdirectories = []
+    audio_files = []
+    unreadable = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                # Slicing from the last dot is much cheaper than os.path.splitext
+                elif (name[name.rfind('.'):].lower() in AUDIO_SUFFIXES
+                        and entry.is_file()):
+                    try:
+                        stat_result = entry.stat()
+                    except OSError as e:
+                        logger.warning("Could not stat %s: %s", entry.path, e)
+                        unreadable.append(entry.path)
+                        continue
+                    fingerprint = (stat_result.st_mtime_ns, stat_result.st_size)
+                    audio_files.append((entry.path, fingerprint))
+    except OSError as e:
+        logger.warning("Could not read directory %s: %s", directory, e)
+        unreadable.append(os.fspath(directory))
+    return subdirectories, audio_files, unreadable
+
+def find_audio_files(root_path: Path, max_workers: int = SCAN_WORKERS,
+                     unreadable_paths: list | None = None) -> list:
+    """
+    Recursively finds audio files under root_path.
+
+    Directories are listed concurrently by up to `max_workers` threads.
+    Returns (file_path, fingerprint) pairs in no particular order. Paths
+    are plain strings, as stored in the database; Path objects are only
+    built for the Songs of files that get parsed. Directories and files
+    that could not be read are appended to `unreadable_paths` if given.
+    """
+    audio_files = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(list_audio_directory, root_path)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirectories, files, unreadable = future.result()
+                audio_files.extend(files)
+                if unreadable_paths is not None:
+                    unreadable_paths.extend(unreadable)
+                pending.update(
+                    executor.submit(list_audio_directory, subdirectory)
+                    for subdirectory in subdirectories
+                )
+    return audio_files
+
+def filter_changed_files(audio_files, existing_fingerprints: dict) -> list:
+    """
+    Returns the (file_path, fingerprint) pairs for files that are new or whose
+    fingerprint differs from the one stored in the database.
+    """
+    return [
+        (file_path, fingerprint) for file_path, fingerprint in audio_files
+        if existing_fingerprints.get(os.fspath(file_path)) != fingerprint
+    ]
 
-    if file_extension not in AUDIO_FILE_EXTENSIONS:
+def find_removed_files(root_path: Path, audio_files, existing_fingerprints: dict,
+                       unreadable_paths=()) -> list:
+    """
+    Returns the stored file paths under root_path that the latest walk did
+    not find, i.e. songs whose files have been deleted or moved away.
+
+    Paths in or under `unreadable_paths` are never reported: a directory
+    that could not be listed (e.g. permissions, or an unmounted drive) does
+    not mean its files are gone.
+    """
+    root_prefix = os.path.join(str(root_path), '')
+    seen_paths = {os.fspath(file_path) for file_path, _ in audio_files}
+    seen_paths.update(unreadable_paths)
+    unreadable_prefixes = tuple(os.path.join(path, '') for path in unreadable_paths)
+    return [
+        file_path for file_path in existing_fingerprints
+        if file_path.startswith(root_prefix) and file_path not in seen_paths
+        and not (unreadable_prefixes and file_path.startswith(unreadable_prefixes))
+    ]
+
+def scan_files(changed_files, executor: ThreadPoolExecutor, workers: int = PARSE_WORKERS,
+               queue_size: int = SCAN_QUEUE_SIZE):
+    """
+    Parses (file_path, fingerprint) pairs concurrently on `executor` and
+    yields the resulting Songs as they finish, skipping unreadable files.
+
+    Up to `workers` parser tasks (producers) pull files from a shared
+    iterator and push Songs onto a bounded queue, which the caller drains
+    (the consumer). The bound keeps parsing at most `queue_size` songs ahead
+    of the database writer, and the writer stays on the caller's thread,
+    the only one allowed to use its SQLite connection.
+    """
+    files = iter(changed_files)
+    files_lock = threading.Lock()
+    results = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            while not stop.is_set():
+                with files_lock:
+                    item = next(files, None)
+                if item is None:
+                    break
+                song = scan_file(*item)
+                if song:
+                    results.put(song)
+        finally:
+            results.put(None)  # This producer is done
+
+    producers = min(workers, len(changed_files))
+    for _ in range(producers):
+        executor.submit(produce)
+
+    running = producers
+    try:
+        while running:
+            song = results.get()
+            if song is None:
+                running -= 1
+            else:
+                yield song
+    finally:
+        # If the consumer stopped early, unblock the producers and let them exit
+        stop.set()
+        while running:
+            if results.get() is None:
+                running -= 1
+
+def configure_worker_logging(level: int) -> None:
+    """
+    Process pool initializer: spawned workers start with an unconfigured
+    root logger, so give them the parent's level and a handler.
+    """
+    logging.basicConfig(level=level)
+
+def scan_files_in_processes(changed_files, executor: ProcessPoolExecutor,
+                            chunksize: int = PROCESS_CHUNK_SIZE):
+    """
+    Parses (file_path, fingerprint) pairs on a process pool and yields the
+    resulting database rows (see song_to_row) in input order, skipping
+    unreadable files. Rows are plain tuples, which are cheaper than Songs
+    to send back from the worker processes.
+
+    Unlike scan_files, tag parsing runs outside this process's GIL, which
+    helps when the files are already in the OS cache and mutagen's pure
+    Python parsing is the bottleneck.
+    """
+    file_paths = [file_path for file_path, _ in changed_files]
+    fingerprints = [fingerprint for _, fingerprint in changed_files]
+    for row in executor.map(scan_file_row, file_paths, fingerprints, chunksize=chunksize):
+        if row:
+            yield row
+
+def scan_file_row(file_path: str | os.PathLike, fingerprint: Optional[Tuple[int, int]] = None) -> tuple | None:
+    """Like scan_file, but returns the song's database row instead of a Song."""
+    from chipichipi.database import song_to_row
+
+    song = scan_file(file_path, fingerprint)
+    return song_to_row(song) if song else None
+
+def scan_file(file_path: str | os.PathLike, fingerprint: Optional[Tuple[int, int]] = None) -> Song | None:
+    """
+    Scans a single audio file and returns a Song object with its metadata.
+
+    Callers are expected to pass files with an extension listed in
+    AUDIO_FILE_EXTENSIONS, as the directory walk does; anything else is
+    returned as None without being parsed.
+    """
+    # Work with the path as a string; the Song gets a Path once parsed
+    file_path = os.fspath(file_path)
+    try:
+        mtime, size = fingerprint or file_fingerprint(file_path)
+    except OSError as e:
+        logger.warning("Could not stat %s: %s", file_path, e)
+        return None
+
+    # Hand out a copy so callers can't modify the cached Song
+    song = read_song_metadata(file_path, mtime, size)
+    return replace(song) if song else None
+
+@contextmanager
+def open_for_tagging(file_path: str, size: int):
+    """
+    Yields the source mutagen should parse a file from.
+
+    Small files are memory-mapped whole, so mutagen's many small reads and
+    seeks hit the mapping instead of making a syscall each. Larger files
+    are yielded as the path and read normally, since their tags and stream
+    info can sit anywhere in the file.
+    """
+    if 0 < size <= MMAP_MAX_SIZE:
+        with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+    else:
+        yield file_path
+
+@lru_cache(maxsize=METADATA_CACHE_SIZE)
+def read_song_metadata(file_path: str, mtime: int, size: int) -> Song | None:
+    """
+    Parses the tags of an audio file into a Song object.
+
+    Results are cached in memory for the whole process, keyed by path,
+    mtime and size, so repeated scans of an unchanged file skip the parse
+    while any edit to the file invalidates its entry.
+    """
+    name = os.path.basename(file_path)
+    specific_class = get_parser_class(name[name.rfind('.'):].lower())
+    if specific_class is None:
         return None
 
     audio_file = None
-    song = Song(file_path=file_path)
+    specific_failed = False
+    song = Song(file_path=Path(file_path), mtime=mtime, size=size)
 
     try:
         # METHOD 1: Try the specific, fast parser first
-        specific_class = AUDIO_FILE_EXTENSIONS.get(file_extension)
-        if specific_class:
-            audio_file = specific_class(file_path)
+        with open_for_tagging(file_path, size) as source:
+            audio_file = specific_class(source)
         
     except Exception as e:
-        logger.debug(f"Specific parser failed for {file_path}: {e}. Trying fallback...")
-        audio_file = None
+        logger.debug("Specific parser failed for %s: %s. Trying fallback...", file_path, e)
+        specific_failed = True
 
-    # METHOD 2: If the specific parser failed, use the slow, generic fallback.
-    if audio_file is None:
+    # METHOD 2: Only if the specific parser raised, use the slow, generic fallback.
+    if specific_failed:
         try:
             audio_file = File(file_path, easy=True)
-            logger.info(f"Used fallback parser for: {file_path}")
+            logger.info("Used fallback parser for: %s", file_path)
         except Exception as e:
-            logger.warning(f"All parsers failed for file {file_path}: {e}")
+            logger.warning("All parsers failed for file %s: %s", file_path, e)
             return None
 
     # If we have a file object (from either method), try to extract tags.
     if audio_file is not None:
         try:
-            # Check if the file has tags at all
-            if audio_file.tags is None:
-                logger.info(f"File has no tags: {file_path}. Will use filename parsing.")
-                # Set empty values and rely on filename parsing later
-                song.title = file_path.stem
-                song.artist = ""
-                song.album = ""
-            else:
-                # Extract tags using the fallback method with safe defaults
-                song.title = clean_metadata_value(str(audio_file.tags.get('title', [file_path.stem])[0]))
-                song.artist = clean_metadata_value(str(audio_file.tags.get('artist', [''])[0]))
-                song.album = clean_metadata_value(str(audio_file.tags.get('album', [''])[0]))
-            
-                    
+            read_tags(song, audio_file)
+
             # Get duration (this should work even if no tags)
             song.duration = get_audio_duration(audio_file)
 
-            # NEW: Smart fallback - if artist is missing/empty, try to parse from filename
-            if not song.artist or song.artist.strip() in ['', 'Unknown Artist']:
-                artist_from_filename, title_from_filename = parse_artist_title_from_filename(file_path.name)
-                
-                if artist_from_filename and title_from_filename:
-                    logger.info(f"Extracted from filename: {artist_from_filename} - {title_from_filename}")
-                    song.artist = artist_from_filename
-                    # Only update title if it's the default (filename stem) or empty
-                    if song.title == file_path.stem or not song.title.strip():
-                        song.title = title_from_filename
-
-            logger.info(f"Scanned: {song.artist} - {song.title}")
+            apply_filename_fallback(song)
+
+            # Logged once per file, so skip the call entirely when INFO is off
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Scanned: %s - %s", song.artist, song.title)
             return song
 
         except Exception as e:
-            logger.error(f"Error extracting tags from {file_path} (file was opened): {e}")
+            logger.error("Error extracting tags from %s (file was opened): %s", file_path, e)
             return None
 
-def scan_directory(root_path: Path, db_conn) -> None:
-    """Recursively scans a directory for audio files and adds them to the database."""
+def read_tags(song: Song, audio_file) -> None:
+    """
+    Fills in a Song's title, artist, album, genre and track number from a
+    parsed mutagen file, using the tag key names of its format (TAG_KEYS).
+    """
+    tags = audio_file.tags
+    stem = song.file_path.stem
+
+    # Check if the file has tags at all; an empty tag block (e.g. an
+    # untagged .m4a) goes straight to filename parsing as well
+    if not tags:
+        logger.info("File has no tags: %s. Will use filename parsing.", song.file_path)
+        # Set empty values and rely on filename parsing later
+        song.title = stem
+        song.artist = ""
+        song.album = ""
+        return
+
+    title_key, artist_key, album_key, genre_key, track_key = TAG_KEYS.get(
+        type(audio_file).__name__, DEFAULT_TAG_KEYS)
+    song.title = clean_metadata_value(tag_text(tags, title_key, stem))
+    song.artist = clean_metadata_value(tag_text(tags, artist_key))
+    song.album = clean_metadata_value(tag_text(tags, album_key))
+    song.genre = clean_metadata_value(tag_text(tags, genre_key))
+    song.track_number = parse_track_number(first_tag_value(tags, track_key))
+
+def apply_filename_fallback(song: Song) -> None:
+    """If a Song has no usable artist, try to take artist and title from its filename."""
+    if song.artist and song.artist.strip() not in ('', 'Unknown Artist'):
+        return
+
+    file_path = song.file_path
+    artist_from_filename, title_from_filename = parse_artist_title_from_filename(file_path.name)
+    if artist_from_filename and title_from_filename:
+        logger.info("Extracted from filename: %s - %s", artist_from_filename, title_from_filename)
+        song.artist = artist_from_filename
+        # Only update title if it's the default (filename stem) or empty
+        if song.title == file_path.stem or not song.title.strip():
+            song.title = title_from_filename
+
+def find_library_changes(root_path: Path, db_conn) -> Tuple[list, list, list]:
+    """
+    Walks root_path once and compares what it finds with the database.
+
+    Returns (audio_files, changed_files, removed_files): every audio file
+    found and the new or changed ones, both as (file_path, fingerprint)
+    pairs, plus the stored paths under root_path that no longer exist.
+    Shared by scan_directory and the GUI's ScannerWorker. Paths are
+    reported under the absolute form of root_path.
+    """
+    from chipichipi.database import load_existing_fingerprints
+
+    # Stored paths are absolute and normalized (str(Path(...)) of the walk's
+    # paths), so walk from such a root: "." would give "./a.mp3", which
+    # never matches the stored "a.mp3"
+    root_path = os.path.abspath(root_path)
+    unreadable_paths = []
+    audio_files = find_audio_files(root_path, unreadable_paths=unreadable_paths)
+
+    # Skip files whose (mtime, size) matches what is already stored
+    existing_fingerprints = load_existing_fingerprints(db_conn)
+    changed_files = filter_changed_files(audio_files, existing_fingerprints)
+    removed_files = find_removed_files(root_path, audio_files, existing_fingerprints,
+                                       unreadable_paths)
+    return audio_files, changed_files, removed_files
+
+def scan_directory(root_path: Path, db_conn, processes: int | None = None) -> None:
+    """
+    Recursively scans a directory for audio files and adds them to the database.
+
+    Tags are parsed on a thread pool, or on a pool of `processes` worker
+    processes when given.
+    """
     root_path = Path(root_path)
 
     if not root_path.is_dir():
         raise ValueError(f"The path {root_path} is not a valid directory.")
 
-    logger.info(f"Starting scan of directory: {root_path}")
+    logger.info("Starting scan of directory: %s", root_path)
 
-    # Find all audio files
-    audio_files = []
-    for file_path in root_path.rglob('*'):
-        if file_path.suffix.lower() in AUDIO_FILE_EXTENSIONS:
-            audio_files.append(file_path)
+    from chipichipi.database import delete_songs, insert_rows, insert_songs
+    audio_files, changed_files, removed_files = find_library_changes(root_path, db_conn)
+
+    logger.info("Found %d audio files, %d new or changed to process", len(audio_files), len(changed_files))
 
-    logger.info(f"Found {len(audio_files)} audio files to process")
+    # Apply all changes in one transaction, unless the caller already opened one
+    if db_conn.in_transaction:
+        transaction = nullcontext()
+    else:
+        db_conn.execute("BEGIN")
+        transaction = db_conn
 
-    # Process each file
-    for file_path in audio_files:
-        song = scan_file(file_path)
-        if song:
-            from chipichipi.database import insert_song
-            insert_song(db_conn, song)
+    with transaction:
+        # Drop songs whose files are no longer there
+        if removed_files:
+            logger.info("Removing %d songs whose files no longer exist", len(removed_files))
+            delete_songs(db_conn, removed_files)
+
+        # Parse files on a pool; the results are streamed into a single
+        # executemany() on this thread, the only writer, which owns the connection
+        if processes:
+            # Spawn rather than fork, the caller may be running other threads
+            with ProcessPoolExecutor(max_workers=processes,
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=configure_worker_logging,
+                                     initargs=(logging.getLogger().getEffectiveLevel(),)) as executor:
+                insert_rows(db_conn, scan_files_in_processes(changed_files, executor), batch_size=None)
+        else:
+            # Parser threads (producers) feed this thread through a bounded queue
+            with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+                insert_songs(db_conn, scan_files(changed_files, executor), batch_size=None)
 
     logger.info("Directory scan complete.")
 
+@lru_cache(maxsize=METADATA_CACHE_SIZE)
 def parse_artist_title_from_filename(filename: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Attempt to extract artist and title from filename.
     """
     # Remove file extension and clean up the filename
-    base_name = re.sub(r'\.(mp3|flac|m4a|wav|aiff|ogg)$', '', filename, flags=re.IGNORECASE)
+    base_name, extension = os.path.splitext(filename)
+    if extension.lower() not in FILENAME_AUDIO_EXTENSIONS:
+        base_name = filename
     base_name = base_name.strip()
     
-    # Try different separator patterns in order of likelihood
-    patterns = [
-        r'^(.*?)\s*[-–—]\s*(.*)$',  # Most common: "Artist - Title" with optional spaces
-        r'^(.*?)\s+by\s+(.*)$',     # "Artist by Title" pattern
-        r'^(.*?)[_](.*)$',          # Underscore separator: "Artist_Title"
-        r'^(.*?)\s*\(\s*(.*)$',     # Parentheses: "Artist (Title)"
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, base_name, re.IGNORECASE)
+    if not ANY_ARTIST_TITLE_SEPARATOR.search(base_name):
+        return None, None
+
+    # Try the separators in order of likelihood, splitting at the first match
+    for separator in ARTIST_TITLE_SEPARATORS:
+        match = separator.search(base_name)
         if match:
-            artist = match.group(1).strip()
-            title = match.group(2).strip()
+            artist = base_name[:match.start()].strip()
+            title = base_name[match.end():].strip()
             
             # Basic validation - both should have meaningful content
             if (artist and title and 
@@ -165,17 +566,37 @@ def parse_artist_title_from_filename(filename: str) -> Tuple[Optional[str], Opti
     return None, None
 
 
+def parse_track_number(value) -> int:
+    """Parse a track number tag such as "3", "3/12" or (3, 12) into an int (0 if missing or invalid)."""
+    if isinstance(value, tuple):
+        # MP4 stores (track, total) pairs
+        value = value[0]
+    try:
+        return int(str(value).split('/', 1)[0])
+    except ValueError:
+        return 0
+
+
+@lru_cache(maxsize=TAG_VALUE_CACHE_SIZE)
 def clean_metadata_value(value: str) -> str:
     """Clean up metadata values by removing common issues."""
     if value is None:
         return ""
     
-    value = str(value).strip()
+    if value.__class__ is not str:
+        value = str(value)
+    value = value.strip()
+
+    # Fast path for already clean values. isprintable() is False for null
+    # characters and for every whitespace character except the plain space,
+    # so with no double spaces there is nothing left for the steps below.
+    if value.isprintable() and '  ' not in value:
+        return value
     
     # Remove null characters and other weird artifacts
     value = value.replace('\x00', '')
     
     # Remove excessive whitespace
-    value = re.sub(r'\s+', ' ', value)
+    value = WHITESPACE_RE.sub(' ', value)
     
     return value
\ No newline at end of file
@@ -1,15 +1,20 @@
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from PySide6.QtCore import QObject, Signal
+from typing import Callable
+from PySide6.QtCore import QObject, QRunnable, Signal, Slot
 
-from chipichipi.database import get_db_connection, init_db
-from chipichipi.scanner import scan_file, scan_directory  # Add scan_file import
+from chipichipi.database import (get_db_connection, close_db_connection, init_schema,
+                                 insert_songs, delete_songs, fetch_song_rows)
+from chipichipi.models import MusicTableModel
+from chipichipi.scanner import PARSE_WORKERS, scan_files, find_library_changes
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Minimum time between progress signals while a batch is being parsed
+PROGRESS_EMIT_INTERVAL_S = 0.05
+
 class ScannerWorker(QObject):
     """Worker class to handle scanning in a separate thread."""
     
@@ -23,13 +28,22 @@ class ScannerWorker(QObject):
     # New signals for progress dialog
     total_files_found = Signal(int)  # Emit total number of files found
     file_processed = Signal(Path, int, int)  # Emit (current_file, processed_count, total_files)
+    songs_written = Signal(list)  # Emit the database rows written by each batch
+    songs_removed = Signal(list)  # Emit the file paths of songs deleted from the database
 
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, directory_path: Path = None, batch_size: int = 500):
         super().__init__()
         self.db_path = db_path
+        self.directory_path = directory_path  # Directory scanned by run()
+        self.batch_size = batch_size  # Files per database batch and per progress signal
         self._is_running = False
         self.should_cancel = False
 
+    @Slot()
+    def run(self):
+        """Scan the directory given at construction; connect to QThread.started."""
+        self.scan(self.directory_path)
+
     def scan(self, directory_path: Path):
         """Perform the scan operation."""
         if self._is_running:
@@ -41,50 +55,54 @@ class ScannerWorker(QObject):
         self.started.emit()
         
         try:
-            # Initialize database
-            init_db(self.db_path)
+            # Open the scan's single connection and make sure the schema exists
             conn = get_db_connection(self.db_path)
             
             try:
-                # First, count all audio files to get total
-                audio_files = []
-                for file_path in directory_path.rglob('*'):
-                    if file_path.suffix.lower() in ['.mp3', '.flac', '.m4a', '.wav', '.aiff']:
-                        audio_files.append(file_path)
+                init_schema(conn)
+
+                # A missing root (e.g. an unmounted drive) would otherwise
+                # look like every song under it had been deleted
+                if not Path(directory_path).is_dir():
+                    raise ValueError(f"The path {directory_path} is not a valid directory.")
+
+                # Walk the directory once; only new or changed files need work
+                _, changed_files, removed_files = find_library_changes(directory_path, conn)
 
-                total_files = len(audio_files)
+                # Drop songs whose files are no longer there
+                if removed_files:
+                    delete_songs(conn, removed_files)
+                    self.songs_removed.emit(removed_files)
+
+                total_files = len(changed_files)
                 self.total_files_found.emit(total_files)
-                self.progress.emit(f"Found {total_files} audio files to process")
-
-                # Now process each file
-                for index, file_path in enumerate(audio_files):
-                    if self.should_cancel:
-                        self.progress.emit("Scan cancelled by user")
-                        return
-                    
-                    # Emit progress for this file
-                    self.file_processed.emit(file_path, index + 1, total_files)
-                    
-                    song = scan_file(file_path)  # This should work now
-                    if song:
-                        from chipichipi.database import insert_song
-                        insert_song(conn, song)  # Fixed variable name from db_conn to conn
+                self.progress.emit(f"Found {total_files} new or changed audio files to process")
 
-                # Check if operation was cancelled
-                if self.should_cancel:
-                    self.progress.emit("Scan cancelled by user")
-                    return
-                
-                # Get the new count of songs
+                # Now process the files batch by batch, one transaction per batch.
+                # Tags are parsed on a thread pool; writes stay on this thread.
+                with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+                    for start in range(0, total_files, self.batch_size):
+                        if self.should_cancel:
+                            break
+                        self._scan_batch(conn, executor, changed_files[start:start + self.batch_size],
+                                         start, total_files)
+
+                # Get the new count of songs; a cancelled scan has still
+                # committed its finished batches and removals
                 cursor = conn.cursor()
                 cursor.execute("SELECT COUNT(*) FROM songs")
                 count = cursor.fetchone()[0]
                 self.count_updated.emit(count)
+
+                # Check if operation was cancelled
+                if self.should_cancel:
+                    self.progress.emit("Scan cancelled by user")
+                    return
                 
                 self.progress.emit(f"Scan complete! Found {count} songs.")
                 
             finally:
-                conn.close()
+                close_db_connection(conn)
                 
         except Exception as e:
             error_msg = f"Scan failed: {str(e)}"
@@ -94,6 +112,64 @@ class ScannerWorker(QObject):
             self._is_running = False
             self.finished.emit()
     
+    def _scan_batch(self, conn, executor, batch, processed_before: int, total_files: int):
+        """Scan and store one batch of files, then report the written rows and progress."""
+        # Within a batch, report progress at most every PROGRESS_EMIT_INTERVAL_S
+        songs = []
+        last_emit = time.monotonic()
+        for song in scan_files(batch, executor):
+            # Leaving the generator stops its parser threads
+            if self.should_cancel:
+                break
+            songs.append(song)
+            now = time.monotonic()
+            if now - last_emit >= PROGRESS_EMIT_INTERVAL_S:
+                self.file_processed.emit(song.file_path, processed_before + len(songs), total_files)
+                last_emit = now
+
+        # Songs parsed before a cancel are complete, so they are still stored
+        if songs:
+            insert_songs(conn, songs, batch_size=None)
+            file_paths = [str(song.file_path) for song in songs]
+            self.songs_written.emit(fetch_song_rows(conn, file_paths, MusicTableModel.COLUMNS))
+
+        # Always report the exact count at the end of the batch
+        if not self.should_cancel:
+            self.file_processed.emit(Path(batch[-1][0]), processed_before + len(batch), total_files)
+
+    @Slot()
     def cancel(self):
         """Cancel the ongoing scan operation."""
-        self.should_cancel = True
\ No newline at end of file
+        self.should_cancel = True
+
+
+class AudioLoadSignals(QObject):
+    """Signals emitted by AudioLoadTask (QRunnable itself cannot emit signals)."""
+
+    loaded = Signal(int, object)  # Emit (generation, file_path) when the file is ready to play
+    failed = Signal(int, object)  # Emit (generation, file_path) when loading failed
+
+
+class AudioLoadTask(QRunnable):
+    """Loads an audio file into the player off the GUI thread."""
+
+    def __init__(self, audio_player, file_path: Path, generation: int,
+                 is_current: Callable[[int], bool], signals: AudioLoadSignals,
+                 duration: float = 0.0):
+        super().__init__()
+        self.audio_player = audio_player
+        self.file_path = file_path
+        self.generation = generation
+        self.is_current = is_current
+        self.signals = signals
+        self.duration = duration  # Duration from the library, 0 if unknown
+
+    def run(self):
+        """Load the file unless a newer load request has superseded this one."""
+        if not self.is_current(self.generation):
+            return
+
+        if self.audio_player.load_file(self.file_path, self.duration):
+            self.signals.loaded.emit(self.generation, self.file_path)
+        else:
+            self.signals.failed.emit(self.generation, self.file_path)
@@ -0,0 +1,93 @@
+from pathlib import Path
+from chipichipi.database import (get_db_connection, init_db, insert_song, insert_songs,
+                                 delete_songs, load_existing_fingerprints)
+from chipichipi.models import Song
+
+def test_insert_songs_in_batches(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+
+    songs = (Song(file_path=Path(f"/music/song{i}.mp3"), title=f"Song {i}") for i in range(25))
+    assert insert_songs(conn, songs, batch_size=10) == 25
+    assert not conn.in_transaction
+
+    count = conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+    assert count == 25
+    conn.close()
+
+def test_insert_song_single_row(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path, row_factory="row")
+
+    insert_song(conn, Song(file_path=Path("/music/a.mp3"), title="A", artist="Artist"))
+
+    row = conn.execute("SELECT title, artist FROM songs WHERE file_path = ?", ("/music/a.mp3",)).fetchone()
+    assert row["title"] == "A"
+    assert row["artist"] == "Artist"
+    conn.close()
+
+def test_connection_uses_wal_and_explicit_transactions(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+
+    assert conn.isolation_level is None
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+def test_upsert_keeps_row_id(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+
+    insert_song(conn, Song(file_path=Path("/music/a.mp3"), title="Old"))
+    first_id = conn.execute("SELECT id FROM songs").fetchone()[0]
+    insert_song(conn, Song(file_path=Path("/music/a.mp3"), title="New"))
+
+    assert conn.execute("SELECT id, title FROM songs").fetchone() == (first_id, "New")
+    conn.close()
+
+def test_load_existing_fingerprints(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+
+    insert_song(conn, Song(file_path=Path("/music/a.mp3"), mtime=123, size=456))
+
+    assert load_existing_fingerprints(conn) == {"/music/a.mp3": (123, 456)}
+    conn.close()
+
+def test_insert_songs_joins_caller_transaction(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+
+    conn.execute("BEGIN")
+    insert_songs(conn, [Song(file_path=Path("/music/a.mp3"))], batch_size=1)
+    assert conn.in_transaction
+    conn.rollback()
+
+    assert conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0] == 0
+    conn.close()
+
+def test_insert_songs_single_streamed_batch(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+
+    songs = (Song(file_path=Path(f"/music/song{i}.mp3")) for i in range(2500))
+    assert insert_songs(conn, songs, batch_size=None) == 2500
+    assert insert_songs(conn, iter([])) == 0
+    conn.close()
+
+def test_delete_songs(tmp_path):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+    insert_songs(conn, [Song(file_path=Path("/music/a.mp3")), Song(file_path=Path("/music/b.mp3"))])
+
+    assert delete_songs(conn, ["/music/a.mp3"]) == 1
+    assert conn.execute("SELECT file_path FROM songs").fetchall() == [("/music/b.mp3",)]
+    conn.close()
@@ -0,0 +1,150 @@
+from pathlib import Path
+from PySide6.QtCore import Qt, QPersistentModelIndex
+from chipichipi.database import get_db_connection, init_db, insert_songs
+from chipichipi.models import MusicTableModel, Song
+
+def make_model(tmp_path, songs):
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+    insert_songs(conn, songs)
+    conn.close()
+
+    model = MusicTableModel(db_path)
+    assert model.select()
+    return model
+
+def test_model_loads_and_formats_rows(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path("/music/a.mp3"), title="A", artist="Artist", duration=125),
+    ])
+
+    assert model.rowCount() == 1
+    assert model.data(model.index(0, model.fieldIndex("title"))) == "A"
+    assert model.data(model.index(0, model.fieldIndex("duration"))) == "2:05"
+    assert model.data(model.index(0, model.fieldIndex("duration")), Qt.EditRole) == 125
+
+def test_model_sorts_in_memory(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path(f"/music/{title}.mp3"), title=title)
+        for title in ("b", "c", "a")
+    ])
+    title_column = model.fieldIndex("title")
+
+    model.sort(title_column, Qt.DescendingOrder)
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["c", "b", "a"]
+
+    # The sort order is kept when the data is reloaded
+    assert model.select()
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["c", "b", "a"]
+
+def test_model_sorts_nulls_last_in_both_directions(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path(f"/music/{i}.mp3"), title=title)
+        for i, title in enumerate(("b", None, "a"))
+    ])
+    title_column = model.fieldIndex("title")
+
+    for order, expected in ((Qt.AscendingOrder, ["a", "b", None]),
+                            (Qt.DescendingOrder, ["b", "a", None])):
+        model.sort(title_column, order)
+        titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+        assert titles == expected
+
+def test_model_upserts_written_rows(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path("/music/a.mp3"), title="A"),
+    ])
+    path_column = model.fieldIndex("file_path")
+    title_column = model.fieldIndex("title")
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+    row = [None] * len(model.COLUMNS)
+    updated, added = list(row), list(row)
+    updated[path_column], updated[title_column] = "/music/a.mp3", "A (Remastered)"
+    added[path_column], added[title_column] = "/music/b.mp3", "B"
+    model.upsert_rows([tuple(updated), tuple(added)])
+
+    assert model.rowCount() == 2
+    assert inserted == [(1, 1)]
+    assert model.data(model.index(0, title_column)) == "A (Remastered)"
+    assert model.data(model.index(1, title_column)) == "B"
+
+def test_model_upserts_keep_sort_order(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path(f"/music/{title}.mp3"), title=title)
+        for title in ("b", "d", "f")
+    ])
+    path_column = model.fieldIndex("file_path")
+    title_column = model.fieldIndex("title")
+    model.sort(title_column, Qt.AscendingOrder)
+    selected = QPersistentModelIndex(model.index(0, title_column))  # "b"
+
+    row = [None] * len(model.COLUMNS)
+    added, updated = list(row), list(row)
+    added[path_column], added[title_column] = "/music/a.mp3", "a"
+    updated[path_column], updated[title_column] = "/music/d.mp3", "z"
+    model.upsert_rows([tuple(added), tuple(updated)])
+
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["a", "b", "f", "z"]
+    assert selected.row() == 1
+
+    # Later upserts still find rows by path after the reorder
+    updated[title_column] = "c"
+    model.upsert_rows([tuple(updated)])
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["a", "b", "c", "f"]
+
+def test_model_inserts_new_rows_in_sort_order(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path(f"/music/{title}.mp3"), title=title)
+        for title in ("b", "d", "f")
+    ])
+    path_column = model.fieldIndex("file_path")
+    title_column = model.fieldIndex("title")
+    model.sort(title_column, Qt.DescendingOrder)
+    selected = QPersistentModelIndex(model.index(1, title_column))  # "d"
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+    def row(title):
+        values = [None] * len(model.COLUMNS)
+        values[path_column], values[title_column] = f"/music/{title}.mp3", title
+        return tuple(values)
+
+    model.upsert_rows([row("a"), row("e"), row("g")])
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["g", "f", "e", "d", "b", "a"]
+    assert selected.row() == 3
+
+    # New rows that land together are inserted as one block
+    model.upsert_rows([row("c"), row("c2")])
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["g", "f", "e", "d", "c2", "c", "b", "a"]
+    assert inserted == [(4, 5)]
+
+def test_model_appends_new_rows_in_id_order(tmp_path):
+    model = make_model(tmp_path, [
+        Song(file_path=Path(f"/music/{title}.mp3"), title=title)
+        for title in ("b", "a")
+    ])
+    id_column = model.fieldIndex("id")
+    title_column = model.fieldIndex("title")
+    model.sort(title_column, Qt.AscendingOrder)
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+
+    # Clearing the sort indicator goes back to database (id) order
+    model.sort(-1, Qt.AscendingOrder)
+    titles = [model.data(model.index(row, title_column)) for row in range(model.rowCount())]
+    assert titles == ["b", "a"]
+
+    values = [None] * len(model.COLUMNS)
+    values[id_column], values[model.fieldIndex("file_path")], values[title_column] = \
+        3, "/music/c.mp3", "c"
+    model.upsert_rows([tuple(values)])
+    assert inserted == [(2, 2)]
@@ -1,5 +1,6 @@
 from pathlib import Path
-from chipichipi.scanner import scan_file
+from chipichipi.scanner import (scan_file, file_fingerprint, find_audio_files, filter_changed_files,
+                                find_removed_files, parse_track_number)
 from chipichipi.models import Song
 
 def test_scan_file(tmp_path):
@@ -8,8 +9,217 @@ def test_scan_file(tmp_path):
     non_audio_file.write_text("not music")
     assert scan_file(non_audio_file) is None
 
-    # TODO: This test would need a real audio file.
-    # For a true unit test, you would "mock" the mutagen.File object.
-    # This is a placeholder for now.
-    # real_song = scan_file(Path("real_song.mp3"))
-    # assert isinstance(real_song, Song)
\ No newline at end of file
+def test_scan_file_reads_mp3_tags(tmp_path):
+    from mutagen.id3 import ID3, TIT2, TPE1, TALB, TCON, TRCK
+
+    audio_file = tmp_path / "song.mp3"
+    # A run of silent MPEG-1 Layer III frames is enough for mutagen to sync on
+    audio_file.write_bytes((b"\xff\xfb\x90\x64" + b"\x00" * 413) * 40)
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text="Title"))
+    tags.add(TPE1(encoding=3, text="Artist"))
+    tags.add(TALB(encoding=3, text="Album"))
+    tags.add(TCON(encoding=3, text="Rock"))
+    tags.add(TRCK(encoding=3, text="3/12"))
+    tags.save(audio_file)
+
+    song = scan_file(audio_file)
+    assert (song.title, song.artist, song.album, song.genre, song.track_number) == \
+        ("Title", "Artist", "Album", "Rock", 3)
+    assert song.duration > 0
+
+def test_scan_file_reads_flac_tags(tmp_path):
+    from mutagen.flac import FLAC
+
+    audio_file = tmp_path / "song.flac"
+    # fLaC marker plus a lone STREAMINFO block: 4096-sample blocks,
+    # 44.1 kHz, stereo, 16 bits per sample, no audio frames
+    stream_info = (4096).to_bytes(2, "big") * 2 + bytes(6)
+    stream_info += ((44100 << 44) | (1 << 41) | (15 << 36)).to_bytes(8, "big") + bytes(16)
+    audio_file.write_bytes(b"fLaC" + b"\x80" + len(stream_info).to_bytes(3, "big") + stream_info)
+    flac = FLAC(audio_file)
+    flac.update({"title": "Title", "artist": "Artist", "album": "Album",
+                 "genre": "Jazz", "tracknumber": "7"})
+    flac.save()
+
+    song = scan_file(audio_file)
+    assert (song.title, song.artist, song.album, song.genre, song.track_number) == \
+        ("Title", "Artist", "Album", "Jazz", 7)
+
+def test_find_audio_files(tmp_path):
+    (tmp_path / "album").mkdir()
+    song = tmp_path / "album" / "song.MP3"
+    song.write_bytes(b"audio")
+    (tmp_path / "cover.jpg").write_bytes(b"image")
+
+    assert find_audio_files(tmp_path) == [(str(song), file_fingerprint(song))]
+
+def test_find_audio_files_nested_directories(tmp_path):
+    expected = set()
+    for artist in range(3):
+        for album in range(3):
+            album_dir = tmp_path / f"artist{artist}" / f"album{album}"
+            album_dir.mkdir(parents=True)
+            for track in range(2):
+                song = album_dir / f"{track}.flac"
+                song.write_bytes(b"audio")
+                expected.add(str(song))
+
+    found = find_audio_files(tmp_path, max_workers=2)
+    assert len(found) == len(expected)
+    assert {path for path, _ in found} == expected
+
+def test_filter_changed_files():
+    unchanged = (Path("/music/unchanged.mp3"), (1, 10))
+    changed = (Path("/music/changed.mp3"), (2, 10))
+    new = (Path("/music/new.mp3"), (3, 10))
+
+    existing = {
+        "/music/unchanged.mp3": (1, 10),
+        "/music/changed.mp3": (0, 0),
+    }
+
+    assert filter_changed_files([unchanged, changed, new], existing) == [changed, new]
+
+def test_scan_file_caches_by_fingerprint(tmp_path, monkeypatch):
+    from chipichipi import scanner
+
+    calls = []
+    def fake_parser(file_path):
+        calls.append(file_path)
+        raise ValueError("not a real mp3")
+    monkeypatch.setattr(scanner, 'get_parser_class', lambda file_extension: fake_parser)
+    monkeypatch.setattr(scanner, 'File', lambda *args, **kwargs: None)
+    scanner.read_song_metadata.cache_clear()
+
+    audio_file = tmp_path / "Artist - Title.mp3"
+    audio_file.write_bytes(b"audio")
+
+    scan_file(audio_file, (1, 5))
+    scan_file(audio_file, (1, 5))
+    assert len(calls) == 1
+
+    # A different fingerprint means the file changed and must be re-read
+    scan_file(audio_file, (2, 5))
+    assert len(calls) == 2
+    scanner.read_song_metadata.cache_clear()
+
+def test_scan_files_stops_producers_when_consumer_stops(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from chipichipi import scanner
+
+    monkeypatch.setattr(scanner, 'scan_file', lambda path, fingerprint: Song(file_path=path))
+    changed_files = [(Path(f"/music/{i}.mp3"), (1, 1)) for i in range(100)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        songs = list(scanner.scan_files(changed_files, executor, workers=4, queue_size=8))
+        assert sorted(song.file_path for song in songs) == sorted(path for path, _ in changed_files)
+
+        # Closing the generator early must not leave producers blocked on the queue
+        partial = scanner.scan_files(changed_files, executor, workers=4, queue_size=2)
+        next(partial)
+        partial.close()
+
+def test_find_removed_files():
+    root = Path("/music/library")
+    audio_files = [(root / "kept.mp3", (1, 10))]
+    existing = {
+        "/music/library/kept.mp3": (1, 10),
+        "/music/library/album/deleted.mp3": (1, 10),
+        "/music/other/elsewhere.mp3": (1, 10),
+        "/music/library-old/sibling.mp3": (1, 10),
+    }
+
+    assert find_removed_files(root, audio_files, existing) == ["/music/library/album/deleted.mp3"]
+
+    # Nothing under a directory (or file) that could not be read is removed
+    assert find_removed_files(root, audio_files, existing, ["/music/library/album"]) == []
+    assert find_removed_files(root, audio_files, existing,
+                              ["/music/library/album/deleted.mp3"]) == []
+
+def test_find_library_changes_keeps_unreadable_directories(tmp_path, monkeypatch):
+    import os
+    from chipichipi.database import get_db_connection, init_db, insert_song
+    from chipichipi.scanner import find_library_changes
+
+    album = tmp_path / "album"
+    album.mkdir()
+    (album / "song.mp3").write_bytes(b"audio")
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+    for file_path in (album / "song.mp3", tmp_path / "deleted.mp3"):
+        insert_song(conn, Song(file_path=file_path))
+
+    scandir = os.scandir
+    failing = {str(album)}
+    def failing_scandir(path):
+        if os.fspath(path) in failing:
+            raise PermissionError(13, "Permission denied", os.fspath(path))
+        return scandir(path)
+    monkeypatch.setattr(os, "scandir", failing_scandir)
+
+    _, _, removed_files = find_library_changes(tmp_path, conn)
+    assert removed_files == [str(tmp_path / "deleted.mp3")]
+
+    # Nor when the root itself cannot be listed (e.g. an unmounted drive)
+    failing.add(str(tmp_path))
+    _, _, removed_files = find_library_changes(tmp_path, conn)
+    assert removed_files == []
+    conn.close()
+
+def test_find_library_changes_from_relative_root(tmp_path, monkeypatch):
+    from chipichipi.database import get_db_connection, init_db, insert_song
+    from chipichipi.scanner import find_library_changes
+
+    song = tmp_path / "song.mp3"
+    song.write_bytes(b"audio")
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+    mtime, size = file_fingerprint(song)
+    insert_song(conn, Song(file_path=song, mtime=mtime, size=size))
+    insert_song(conn, Song(file_path=tmp_path / "deleted.mp3"))
+
+    # "." must match the absolute paths stored by earlier scans
+    monkeypatch.chdir(tmp_path)
+    audio_files, changed_files, removed_files = find_library_changes(Path("."), conn)
+    assert audio_files == [(str(song), (mtime, size))]
+    assert changed_files == []
+    assert removed_files == [str(tmp_path / "deleted.mp3")]
+    conn.close()
+
+def test_scan_directory_commits_once(tmp_path):
+    from chipichipi.database import get_db_connection, init_db, insert_song
+    from chipichipi.scanner import scan_directory
+
+    db_path = tmp_path / "library.db"
+    init_db(db_path)
+    conn = get_db_connection(db_path)
+    insert_song(conn, Song(file_path=tmp_path / "gone.mp3"))
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    scan_directory(tmp_path, conn)
+
+    assert not conn.in_transaction
+    assert statements.count("COMMIT") == 1
+    assert conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0] == 0
+    conn.close()
+
+def test_parse_track_number():
+    assert parse_track_number("3") == 3
+    assert parse_track_number("3/12") == 3
+    assert parse_track_number("") == 0
+    assert parse_track_number("A1") == 0
+    assert parse_track_number((3, 12)) == 3
+
+def test_scan_workers_from_env(monkeypatch):
+    from chipichipi.scanner import DEFAULT_SCAN_WORKERS, scan_workers_from_env
+
+    monkeypatch.setenv('CHIPICHIPI_SCAN_WORKERS', '8')
+    assert scan_workers_from_env() == 8
+    monkeypatch.setenv('CHIPICHIPI_SCAN_WORKERS', 'abc')
+    assert scan_workers_from_env() == DEFAULT_SCAN_WORKERS
+    monkeypatch.delenv('CHIPICHIPI_SCAN_WORKERS')
+    assert scan_workers_from_env() == DEFAULT_SCAN_WORKERS